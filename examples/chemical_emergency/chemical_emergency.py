@@ -1,15 +1,378 @@
 import os
+import asyncio
+import atexit
+import functools
+import hashlib
 import logging
-import datetime
 import json
 import re
-from typing import Dict, List, Callable, Union, Optional
+import string
+from collections import OrderedDict
+from typing import Dict, List, Union, Optional
 from dataclasses import dataclass
 from graph_of_thoughts import controller, language_models, operations, prompter, parser
-from graph_of_thoughts.operations.thought import Thought
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# C加速的JSON解析（orjson约为标准库的3-5倍），未安装orjson时退回标准库
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _dumps_compact(obj, sort_keys: bool = False) -> str:
+    """紧凑JSON序列化：orjson在Rust侧完成遍历与UTF-8编码，缺失时回退stdlib。"""
+    if orjson is not None:
+        return orjson.dumps(
+            obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0
+        ).decode()
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys
+    )
+
+# 可复用的解码器：raw_decode能在一次扫描中取出首个完整JSON对象，
+# 无需依赖rfind('}')这种对嵌套括号脆弱的启发式
+_DECODER = json.JSONDecoder()
+
+# 各阶段结构验证所需的关键字段及最少命中数，frozenset交集在C层完成，
+# 避免每次验证重建key列表并逐个做成员检查
+_STAGE_KEYS = (
+    frozenset({"basic_info", "accident_info", "weather_conditions",
+               "geographical_info", "sensitive_targets"}),
+    frozenset({"dispersion_prediction", "population_impact",
+               "environmental_impact", "secondary_disasters", "social_impact"}),
+    frozenset({"emergency_level", "evacuation_plan", "onsite_response",
+               "medical_response", "environmental_monitoring",
+               "resource_allocation", "information_management", "recovery_plan"}),
+)
+_STAGE_MIN = (3, 2, 1)
+_STAGE_NAMES = ("情景分析", "影响评估", "响应计划")
+# 输出文件中三个阶段的键名，提取与保存路径共用
+_PHASE_NAMES = ("situation_analysis", "impact_assessment", "response_plan")
+
+# 响应计划兜底提取的字段顺序：比_STAGE_KEYS[2]多出两个可选字段，
+# 且保持稳定的输出顺序（frozenset无序，不适合直接投影）
+_RESPONSE_PLAN_FIELDS = (
+    "emergency_level", "evacuation_plan", "onsite_response",
+    "medical_response", "environmental_monitoring", "resource_allocation",
+    "information_management", "recovery_plan",
+    "secondary_disaster_prevention", "special_material_handling",
+)
+# 同一组字段的frozenset视图，供修复路径按键过滤扫描结果
+_RESPONSE_PLAN_KEYSET = frozenset(_RESPONSE_PLAN_FIELDS)
+
+# 情景分析子状态的字段名，阶段2和阶段3的提示都要引用这组字段
+_SITUATION_KEYS = ("basic_info", "accident_info", "weather_conditions",
+                   "geographical_info", "sensitive_targets")
+
+# 各阶段输出的顶层结构模型：pydantic v2的Rust后端在一次扫描中同时完成
+# JSON解码与顶层键类型校验，比通用json.loads+逐键检查更快。叶子内容保持
+# 无类型Dict，宽松的字段数阈值验证仍由validate_json_structure负责。
+# pydantic随openai依赖安装；若环境中只有v1（无ConfigDict）则跳过该快速路径。
+try:
+    import pydantic
+
+    class _SituationAnalysisModel(pydantic.BaseModel):
+        model_config = pydantic.ConfigDict(extra="allow")
+        basic_info: Optional[Dict] = None
+        accident_info: Optional[Dict] = None
+        weather_conditions: Optional[Dict] = None
+        geographical_info: Optional[Dict] = None
+        sensitive_targets: Optional[Dict] = None
+
+    class _ImpactAssessmentModel(pydantic.BaseModel):
+        model_config = pydantic.ConfigDict(extra="allow")
+        dispersion_prediction: Optional[Dict] = None
+        population_impact: Optional[Dict] = None
+        environmental_impact: Optional[Dict] = None
+        secondary_disasters: Optional[Dict] = None
+        social_impact: Optional[Dict] = None
+
+    class _ResponsePlanModel(pydantic.BaseModel):
+        model_config = pydantic.ConfigDict(extra="allow")
+        emergency_level: Optional[Dict] = None
+        evacuation_plan: Optional[Dict] = None
+        onsite_response: Optional[Dict] = None
+        medical_response: Optional[Dict] = None
+        environmental_monitoring: Optional[Dict] = None
+        resource_allocation: Optional[Dict] = None
+        information_management: Optional[Dict] = None
+        recovery_plan: Optional[Dict] = None
+        secondary_disaster_prevention: Optional[Dict] = None
+        special_material_handling: Optional[Dict] = None
+
+    _STAGE_MODELS = (_SituationAnalysisModel, _ImpactAssessmentModel, _ResponsePlanModel)
+except (ImportError, AttributeError):
+    _STAGE_MODELS = None
+
+# 思想状态中缓存情景分析/影响评估序列化结果的键：仅供进程内复用，
+# 持久化前由_strip_private_keys统一剥除
+_SITUATION_JSON_CACHE_KEY = "_situation_analysis_json"
+_IMPACT_JSON_CACHE_KEY = "_impact_assessment_json"
+_PRIVATE_STATE_KEYS = frozenset({_SITUATION_JSON_CACHE_KEY, _IMPACT_JSON_CACHE_KEY})
+
+
+def _compile_template(template: str) -> tuple:
+    """
+    将格式化模板预解析为(literal, field)片段元组。
+
+    提示模板长达数KB且包含成百上千个{{/}}转义括号，str.format每次调用
+    都会重新扫描整个模板；预解析后渲染只需一次join。
+    """
+    return tuple(
+        (literal, field)
+        for literal, field, _spec, _conversion in string.Formatter().parse(template)
+        if literal or field
+    )
+
+
+def _fold_single_slot(segments: tuple) -> tuple:
+    """
+    将仅含一个替换槽的片段序列折叠为(前缀, 后缀)两个常量串。
+
+    渲染退化为两次拼接，连片段循环都省掉；槽位多于一个时抛ValueError。
+    """
+    prefix: List[str] = []
+    suffix: List[str] = []
+    seen = False
+    for literal, field in segments:
+        (suffix if seen else prefix).append(literal)
+        if field:
+            if seen:
+                raise ValueError("模板含有多个替换槽")
+            seen = True
+    return "".join(prefix), "".join(suffix)
+
+
+def _render(segments: tuple, **kwargs) -> str:
+    """用预解析的片段渲染模板，等价于对原模板调用.format(**kwargs)。"""
+    parts = []
+    for literal, field in segments:
+        if literal:
+            parts.append(literal)
+        if field:
+            value = kwargs[field]
+            parts.append(value if type(value) is str else str(value))
+    return "".join(parts)
+
+
+# 扫描器用的结构字符模式：让C实现的正则引擎按块跳过普通内容，
+# 解释器只在引号与括号处接管，而非逐字符循环
+_RE_STRUCT = re.compile(r'["{}\[\]]')
+_RE_SCALAR_END = re.compile(r'[,}]')
+_RE_BRACKETS = re.compile(r'[{}\[\]]')
+
+
+def _scan_top_level(text: str, seen_keys: Optional[set] = None) -> Dict[str, str]:
+    """
+    单趟扫描顶层JSON对象，返回{键: 原始值子串}。
+
+    从首个'{'开始维护括号深度与字符串转义状态，只收录完整闭合的值；
+    被截断的值不会出现在结果里。替代对同一文本逐键运行的嵌套量词
+    回溯正则（最坏O(k·n²)），复杂度O(n)，且引号/括号之间的普通内容
+    由str.find与预编译正则在C层成块跳过。
+
+    传入seen_keys集合时，所有读到的顶层键（含值被截断的）都会记入
+    其中，调用方无需为"某键是否出现过"再扫一遍全文。
+    """
+    result: Dict[str, str] = {}
+    start: int = text.find('{')
+    if start == -1:
+        return result
+    n: int = len(text)
+
+    def _skip_string(j: int) -> int:
+        # j指向开引号后的第一个字符；返回闭引号后的位置，未闭合返回-1。
+        # str.find在C层跳到下一个引号，回看连续反斜杠的奇偶判断转义
+        while True:
+            k = text.find('"', j)
+            if k == -1:
+                return -1
+            b = k - 1
+            while b >= j and text[b] == '\\':
+                b -= 1
+            if (k - b) % 2 == 1:
+                return k + 1
+            j = k + 1
+
+    i: int = start + 1
+    while i < n:
+        c = text[i]
+        if c in ' \t\r\n,':
+            i += 1
+            continue
+        if c == '}':
+            break
+        if c != '"':
+            i += 1
+            continue
+        key_end = _skip_string(i + 1)
+        if key_end == -1:
+            break
+        key = text[i + 1:key_end - 1]
+        if seen_keys is not None:
+            seen_keys.add(key)
+        i = key_end
+        while i < n and text[i] in ' \t\r\n':
+            i += 1
+        if i >= n:
+            break
+        if text[i] != ':':
+            continue
+        i += 1
+        while i < n and text[i] in ' \t\r\n':
+            i += 1
+        if i >= n:
+            break
+        value_start: int = i
+        c = text[i]
+        if c == '"':
+            end = _skip_string(i + 1)
+            if end == -1:
+                break
+            result[key] = text[value_start:end]
+            i = end
+        elif c in '{[':
+            depth: int = 0
+            j: int = i
+            closed = False
+            while True:
+                match = _RE_STRUCT.search(text, j)
+                if match is None:
+                    break
+                cj = match.group()
+                if cj == '"':
+                    j = _skip_string(match.start() + 1)
+                    if j == -1:
+                        break
+                    continue
+                if cj in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        end = match.start() + 1
+                        result[key] = text[value_start:end]
+                        i = end
+                        closed = True
+                        break
+                j = match.start() + 1
+            if not closed:
+                break
+        else:
+            # 标量值：读到顶层逗号或闭括号；读到文本末尾视为截断不收录
+            match = _RE_SCALAR_END.search(text, i)
+            if match is None:
+                break
+            j = match.start()
+            value = text[value_start:j].strip()
+            if value:
+                result[key] = value
+            i = j
+    return result
+
+
+# 修复路径的预编译正则：模式在模块加载时解析一次，修复调用不再经过
+# re._compile的缓存查找，也不挤占re模块512条的全局缓存
+_RE_WS = re.compile(r"\s+")
+# 单字符类否定先行替代六分支交替：每个位置只查一次字符类。类中含\s，
+# 迫使贪婪的\s*吃尽空白后才判定，修掉了旧模式在空白前就能匹配、
+# 把"key": {误补成"key": "未知" {的缺陷
+_RE_MISSING_VALUE = re.compile(r'"([^"]+)"\s*:\s*(?![\s"tfn0-9{\[-])')
+_RE_EMERGENCY_LEVEL = re.compile(r'"emergency_level"\s*:\s*{([^}]+)}')
+
+# 字段级截断伪影的合并清理：尾逗号闭合与引号后空白闭合在同一趟
+# 扫描里处理，替换函数按首字符分派，省去对同一文本的二次扫描
+# 修复彻底失败时的兜底紧急等级：字符串与对象形式各留一份模块常量，
+# 失败热路径上不再反复构造字面量或重新解析
+_FALLBACK_LEVEL_JSON = '{"emergency_level":{"level":"I级","reason":"爆炸事故影响范围广泛"}}'
+_FALLBACK_LEVEL_OBJ = {"emergency_level": {"level": "I级", "reason": "爆炸事故影响范围广泛"}}
+
+_RE_FIELD_CLEANUP = re.compile(r',\s*}|"\s+}')
+
+# 兜底修复的四条逗号规则合并为一趟：尾逗号闭合（对象/数组）与
+# 引号后缺逗号（接对象/数组）用同一个交替模式加分派回调处理
+_RE_FALLBACK_CLEANUP = re.compile(r',\s*([}\]])|"\s*([{\[])')
+
+
+def _fallback_cleanup_repl(match: "re.Match") -> str:
+    closing = match.group(1)
+    return closing if closing is not None else '",' + match.group(2)
+
+
+
+def _field_cleanup_repl(match: "re.Match") -> str:
+    return '}' if match.group(0)[0] == ',' else '"}'
+
+
+# 外层字段截断时的子字段抢救表：
+# 键 -> (子字段名, 探针子串, 扁平匹配正则, 是否数组)。
+# 先用str.__contains__做C层子串探针，子字段不在文本里时根本不启动
+# 正则引擎；模式中不含嵌套量词，单次search即线性扫描
+_SUBFIELD_SALVAGE = {
+    "onsite_response": (
+        "isolation_zone", '"isolation_zone"',
+        re.compile(r'"isolation_zone"\s*:\s*{([^{}]*)}'), False
+    ),
+    "medical_response": (
+        "triage_locations", '"triage_locations"',
+        re.compile(r'"triage_locations"\s*:\s*\[(.*?)\]'), True
+    ),
+    "resource_allocation": (
+        "emergency_personnel", '"emergency_personnel"',
+        re.compile(r'"emergency_personnel"\s*:\s*{([^{}]*)}'), False
+    ),
+    "information_management": (
+        "notification_chain", '"notification_chain"',
+        re.compile(r'"notification_chain"\s*:\s*{([^{}]*)}'), False
+    ),
+    "recovery_plan": (
+        "site_cleanup", '"site_cleanup"',
+        re.compile(r'"site_cleanup"\s*:\s*{([^{}]*)}'), False
+    ),
+    "secondary_disaster_prevention": (
+        "explosion_prevention", '"explosion_prevention"',
+        re.compile(r'"explosion_prevention"\s*:\s*{([^{}]*)}'), False
+    ),
+}
+
+
+def _extract_situation(state: Dict) -> Dict:
+    """从状态中抽取情景分析的五个顶层子字段，缺失键补空字典。"""
+    return {key: state.get(key, {}) for key in _SITUATION_KEYS}
+
+
+def _dump_situation_json(state: Dict) -> str:
+    """将状态中的情景分析子字段序列化为提示用的JSON串。"""
+    # 紧凑分隔符：缩进空白对模型没有语义价值，却按token计费
+    return _dumps_compact(_extract_situation(state))
+
+# 按（操作索引，归一化输入，前序状态）缓存LLM响应文本，
+# 相同事故的重复运行（如开发调试）直接命中，不再产生token开销。
+# OrderedDict实现LRU淘汰：批量驱动大量事故时驻留内存的响应文本
+# 有上界，命中移到末尾，超限从最旧一端弹出
+_RESPONSE_CACHE_MAX = 1024
+_RESPONSE_CACHE: "OrderedDict[str, List[str]]" = OrderedDict()
+
+
+def _normalize_text(text: str) -> str:
+    """归一化输入文本用于缓存键：折叠空白并转为小写，消除无意义的格式差异。"""
+    return _RE_WS.sub(" ", text).strip().lower()
+
+
+def _response_cache_key(operation_index: int, input_text: str, state: Dict) -> str:
+    """计算响应缓存键：对阶段、归一化输入和前序状态的序列化结果做SHA-256。"""
+    raw = "%d|%s|%s" % (
+        operation_index,
+        _normalize_text(input_text),
+        _dumps_compact(state, sort_keys=True),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
 @dataclass
 class EmergencyResponse:
     """Data class for emergency response results."""
@@ -21,20 +384,9 @@ class ValidationError(Exception):
     """Custom exception for validation errors."""
     pass
 
-class ChemicalEmergencyPrompter(prompter.Prompter):
-    """
-    ChemicalEmergencyPrompter provides the generation of prompts specific to the chemical
-    emergency response for the language models.
-
-    Inherits from the Prompter class and implements its abstract methods.
-    """
-
-    def __init__(self):
-        """Initialize the ChemicalEmergencyPrompter."""
-        super().__init__()
-        self.logger = logging.getLogger(__name__)
-
-    situation_analysis_prompt = """
+# 提示模板本体：模块级常量在import时就绪，类属性只保留同名别名；
+# LOAD_GLOBAL路径上的常量访问也免去type.__getattribute__的MRO查找
+SITUATION_ANALYSIS_PROMPT = """
     你是一名专业的化工安全分析师，请分析以下化工事故情况，并提取关键信息。
     
     事故描述：
@@ -79,7 +431,49 @@ class ChemicalEmergencyPrompter(prompter.Prompter):
     注意：输出必须严格按照上述JSON格式，所有键名均使用英文。如果某些信息在事故描述中未提及，请根据合理推测填写，或者填写"信息不足"。
     """
 
-    impact_assessment_prompt = """
+BATCH_SITUATION_ANALYSIS_PROMPT = """
+    你是一名专业的化工安全分析师，下面给出 {num_incidents} 起相互独立的化工事故，请逐一分析并提取关键信息。
+
+{incident_descriptions}
+
+    请为每起事故输出一个JSON对象，并将所有对象按编号顺序放入一个JSON数组。
+    数组长度必须等于 {num_incidents}，数组中第 i 个对象对应事故描述[i]，
+    且每个对象需额外包含 "index" 字段（整数，对应事故编号）。
+
+    单个对象的JSON格式如下：
+    {{
+      "index": 事故编号,
+      "basic_info": {{
+        "time": "事发时间（格式：YYYY-MM-DD HH:MM:SS）",
+        "location": "事发地点",
+        "company": "发生事故的企业名称"
+      }},
+      "accident_info": {{
+        "type": "事故类型（如泄漏、爆炸、火灾等）",
+        "status": "事故当前状态（如持续泄漏、已控制等）",
+        "development": "事故发展情况（如如何发生的、扩散状况等）"
+      }},
+      "weather_conditions": {{
+        "weather": "天气状况（如晴、雨、雪等）",
+        "wind_direction": "风向",
+        "wind_speed": "风速",
+        "temperature": "温度（摄氏度）"
+      }},
+      "geographical_info": {{
+        "area_type": "区域类型（如工业区、城市、乡村等）",
+        "distance_to_residential": "距离最近居民区的距离（米）"
+      }},
+      "sensitive_targets": {{
+        "residential_areas": ["附近居民区列表"],
+        "schools": ["附近学校列表"],
+        "hospitals": ["附近医院列表"]
+      }}
+    }}
+
+    注意：输出必须严格按照上述JSON格式，所有键名均使用英文。如果某些信息在事故描述中未提及，请根据合理推测填写，或者填写"信息不足"。
+    """
+
+IMPACT_ASSESSMENT_PROMPT = """
     你是一名专业的化工安全评估专家，请基于以下化工事故的情景分析，评估潜在影响和后果。
     
     情景分析数据：
@@ -145,7 +539,7 @@ class ChemicalEmergencyPrompter(prompter.Prompter):
     注意：输出必须严格按照上述JSON格式，所有键名均使用英文，确保所有键名对应的内容均使用中文。如果某些信息无法基于给定的情景分析进行评估，请标记为"信息不足"。请基于专业知识进行推断，确保评估结果的合理性。
     """
 
-    response_plan_prompt = """
+RESPONSE_PLAN_PROMPT = """
     你是一名专业的化工应急管理专家，请基于以下化工事故的情景分析和影响评估，制定详细的应急响应计划。
     
     事故信息：
@@ -612,6 +1006,155 @@ class ChemicalEmergencyPrompter(prompter.Prompter):
     注意：输出必须严格按照上述JSON格式，所有键名均使用英文，确保所有键名对应的内容均使用中文。如果某些信息无法基于给定的情景分析进行评估，请标记为"信息不足"。请基于专业知识进行推断，确保评估结果的合理性。参考天津港"8·12"特别重大火灾爆炸事故的经验教训，特别注意针对硝酸铵、氰化钠等高危险化学品的专项处置方案。
     """
 
+# 参考案例块在模块加载时处理一次：从模板中摘出转义括号形式的JSON，
+# 解析后按紧凑分隔符重排，去掉近四成纯缩进空白的token开销。
+# 案例不再无条件随每次阶段3调用发送：仅当事故类型命中案例领域
+# （爆炸/火灾）或调用方显式传include_reference=True时注入。
+_REF_MARKER = '    参考案例 - 天津港"8·12"特别重大火灾爆炸事故应急响应：\n'
+_OUTPUT_MARKER = "    输出JSON格式如下："
+_ref_start = RESPONSE_PLAN_PROMPT.index(_REF_MARKER)
+_ref_end = RESPONSE_PLAN_PROMPT.index(_OUTPUT_MARKER)
+REFERENCE_CASE_BLOCK = (
+    _REF_MARKER
+    + "    "
+    + json.dumps(
+        json.loads(
+            RESPONSE_PLAN_PROMPT[_ref_start + len(_REF_MARKER):_ref_end]
+            .replace("{{", "{")
+            .replace("}}", "}")
+        ),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    + "\n\n"
+)
+RESPONSE_PLAN_PROMPT = (
+    RESPONSE_PLAN_PROMPT[:_ref_start]
+    + "{reference_case}"
+    + RESPONSE_PLAN_PROMPT[_ref_end:]
+)
+del _ref_start, _ref_end
+
+
+class ChemicalEmergencyPrompter(prompter.Prompter):
+    """
+    ChemicalEmergencyPrompter provides the generation of prompts specific to the chemical
+    emergency response for the language models.
+
+    Inherits from the Prompter class and implements its abstract methods.
+    """
+
+    def __init__(self):
+        """Initialize the ChemicalEmergencyPrompter."""
+        super().__init__()
+        # 复用模块级logger，省去每个实例一次注册表查找
+        self.logger = logger
+        # 按operation_index下标索引的阶段方法表，generate_prompt直接
+        # 分派到绑定方法，免去每次调用都走一遍if/elif链
+        self._dispatch = (
+            self._prompt_stage0,
+            self._prompt_stage1,
+            self._prompt_stage2,
+        )
+
+    # 批量提示中单次请求包含的最大事故数，更大的批次会明显降低结构化输出的准确率
+    # 模板本体见模块级常量；类属性保留同名别名，兼容既有访问方式
+    situation_analysis_prompt = SITUATION_ANALYSIS_PROMPT
+    batch_situation_analysis_prompt = BATCH_SITUATION_ANALYSIS_PROMPT
+    impact_assessment_prompt = IMPACT_ASSESSMENT_PROMPT
+    response_plan_prompt = RESPONSE_PLAN_PROMPT
+    reference_case_block = REFERENCE_CASE_BLOCK
+
+    MAX_BATCH_SIZE = 8
+
+
+
+
+    # 静态指令前缀（事故数据移入用户消息），在类加载时计算一次。
+    # 每个阶段的前缀在所有请求之间保持逐字节一致，使供应商侧的
+    # 提示前缀缓存（OpenAI自动前缀缓存 / Anthropic cache_control）可以命中。
+    situation_analysis_system_prefix = situation_analysis_prompt.format(
+        incident_description="（见用户消息中的事故描述）"
+    )
+    impact_assessment_system_prefix = impact_assessment_prompt.format(
+        situation_analysis="（见用户消息中的情景分析数据）"
+    )
+    response_plan_system_prefix = response_plan_prompt.format(
+        accident_info="（见用户消息中的事故信息）",
+        impact_info="（见用户消息中的影响评估）",
+        reference_case="",
+    )
+
+    # 模板预解析为(literal, field)片段，渲染退化为一次join，
+    # 免去每次调用.format时对数KB模板的全量括号扫描
+    _situation_segments = _compile_template(situation_analysis_prompt)
+    _batch_situation_segments = _compile_template(batch_situation_analysis_prompt)
+    _impact_segments = _compile_template(impact_assessment_prompt)
+    _response_segments = _compile_template(response_plan_prompt)
+
+    # 单槽位模板进一步折叠为(前缀, 后缀)常量，阶段1/2的渲染就是两次拼接
+    _situation_prefix, _situation_suffix = _fold_single_slot(_situation_segments)
+    _impact_prefix, _impact_suffix = _fold_single_slot(_impact_segments)
+
+    def generate_messages(
+        self, state: Dict, operation_index: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        生成system/user两段式的消息列表。
+
+        静态指令块（角色设定 + JSON模式说明）作为system消息，在各次请求之间
+        完全相同，从而能命中供应商侧的提示前缀缓存；随事故变化的数据部分单独
+        放入user消息。
+
+        Args:
+            state: 当前状态
+            operation_index: 操作索引，用于确定使用哪个提示模板
+
+        Returns:
+            List[Dict]: system和user两条消息
+        """
+        if operation_index is None:
+            operation_index = state.get("operation_index", 0)
+
+        input_text = state.get("input_text", "")
+        current_state = state.get("state", {})
+
+        if operation_index == 0:
+            system_prefix = self.situation_analysis_system_prefix
+            user_content = f"事故描述：\n{input_text}"
+        elif operation_index == 1:
+            system_prefix = self.impact_assessment_system_prefix
+            situation_analysis_json = current_state.get(_SITUATION_JSON_CACHE_KEY)
+            if situation_analysis_json is None:
+                situation_analysis_json = _dump_situation_json(current_state)
+                current_state[_SITUATION_JSON_CACHE_KEY] = situation_analysis_json
+            user_content = f"情景分析数据：\n{situation_analysis_json}"
+        elif operation_index == 2:
+            system_prefix = self.response_plan_system_prefix
+            accident_info_json = current_state.get(_SITUATION_JSON_CACHE_KEY)
+            if accident_info_json is None:
+                accident_info_json = _dump_situation_json(current_state)
+                current_state[_SITUATION_JSON_CACHE_KEY] = accident_info_json
+            impact_info_json = current_state.get(_IMPACT_JSON_CACHE_KEY)
+            if impact_info_json is None:
+                impact_info_json = _dumps_compact(
+                    current_state.get("impact_assessment", {})
+                )
+                current_state[_IMPACT_JSON_CACHE_KEY] = impact_info_json
+            user_content = f"事故信息：\n{accident_info_json}\n\n影响评估：\n{impact_info_json}"
+            # 参考案例与事故领域匹配时附在用户消息尾部：system前缀在
+            # 各请求间保持逐字节一致以命中前缀缓存，参考块随数据走
+            if self._wants_reference_case(current_state):
+                user_content += "\n\n" + self.reference_case_block
+        else:
+            # 未知阶段，退回单条用户消息
+            return [{"role": "user", "content": self.generate_prompt(state, operation_index)}]
+
+        return [
+            {"role": "system", "content": system_prefix},
+            {"role": "user", "content": user_content},
+        ]
+
     def aggregation_prompt(self, state_dicts: List[Dict], **kwargs) -> str:
         """
         Generate an aggregation prompt for the language model.
@@ -625,13 +1168,23 @@ class ChemicalEmergencyPrompter(prompter.Prompter):
         # Implement aggregation logic if needed
         return ""
 
-    def generate_prompt(self, state: Dict, operation_index: Optional[int] = None) -> str:
+    def generate_prompt(
+        self,
+        state: Dict,
+        operation_index: Optional[int] = None,
+        batch: Optional[List[str]] = None,
+        include_reference: Optional[bool] = None,
+    ) -> str:
         """
         根据当前状态和操作索引生成提示。
 
         Args:
             state: 当前状态
             operation_index: 操作索引，用于确定使用哪个提示模板
+            batch: 可选的事故描述列表。提供时生成批量情景分析提示，
+                将多起事故合并为一次LLM调用以摊薄指令块的token开销
+            include_reference: 是否在阶段3提示中附上参考案例；
+                None时按事故类型与案例领域是否匹配自动判断
 
         Returns:
             str: 生成的提示
@@ -640,92 +1193,126 @@ class ChemicalEmergencyPrompter(prompter.Prompter):
         if operation_index is None:
             operation_index = state.get("operation_index", 0)
 
-        self.logger.info(f"生成提示，操作索引: {operation_index}")
-        
-        # 获取输入文本
-        input_text = state.get("input_text", "")
-        
-        # 获取当前状态数据（如果有）
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("生成提示，操作索引: %s", operation_index)
+
+        # 批量模式：将多起事故描述合并为一个带[i]编号的提示
+        if batch is not None:
+            if len(batch) > self.MAX_BATCH_SIZE:
+                self.logger.warning(
+                    "批量大小 %d 超过上限 %d，将被截断", len(batch), self.MAX_BATCH_SIZE
+                )
+                batch = batch[: self.MAX_BATCH_SIZE]
+            incident_descriptions = "\n\n".join(
+                f"    事故描述[{i}]：\n{description}"
+                for i, description in enumerate(batch, 1)
+            )
+            return _render(
+                self._batch_situation_segments,
+                num_incidents=len(batch),
+                incident_descriptions=incident_descriptions,
+            )
+
+        # 按操作索引直接分派到对应阶段的提示方法；仅在调用方显式
+        # 覆盖include_reference时才需要走带额外参数的阶段3分支
+        if include_reference is not None and operation_index == 2:
+            return self._prompt_stage2(state, include_reference)
+        if 0 <= operation_index < len(self._dispatch):
+            return self._dispatch[operation_index](state)
+
+        # 未知阶段，返回默认提示
+        self.logger.warning("未知的操作索引: %s", operation_index)
+        return "请分析这个化工应急事件。"
+
+    def generate_prompts_batch(
+        self, states: List[Dict], operation_index: int
+    ) -> List[str]:
+        """
+        为同一阶段的多个思想状态一次性生成提示。
+
+        各提示共享同一份阶段模板前缀（同一Python字符串对象），配合
+        服务端的提示前缀缓存，批内除首个请求外的静态段近乎免费。
+
+        Args:
+            states: 同一阶段待生成提示的状态列表
+            operation_index: 操作索引，用于确定使用哪个提示模板
+
+        Returns:
+            List[str]: 与states一一对应的提示列表
+        """
+        if 0 <= operation_index < len(self._dispatch):
+            builder = self._dispatch[operation_index]
+            return [builder(state) for state in states]
+        self.logger.warning("未知的操作索引: %s", operation_index)
+        return ["请分析这个化工应急事件。"] * len(states)
+
+    def _prompt_stage0(self, state: Dict) -> str:
+        """阶段1：情景分析提示。"""
+        return (
+            self._situation_prefix
+            + state.get("input_text", "")
+            + self._situation_suffix
+        )
+
+    def _prompt_stage1(self, state: Dict) -> str:
+        """阶段2：影响评估提示，复用前一阶段缓存的序列化结果。"""
         current_state = state.get("state", {})
-        
-        # 根据操作索引选择提示模板
-        if operation_index == 0:
-            # 阶段1：情景分析
-            return self.situation_analysis_prompt.format(
-                incident_description=input_text
+        if not isinstance(current_state, dict):
+            self.logger.warning("无法从前一阶段获取状态信息")
+            current_state = {}
+        # 优先复用解析阶段缓存的序列化结果，避免重复json.dumps
+        situation_analysis_json = current_state.get(_SITUATION_JSON_CACHE_KEY)
+        if situation_analysis_json is None:
+            situation_analysis_json = _dump_situation_json(current_state)
+            # 回填缓存，同一思想的后续阶段直接复用
+            current_state[_SITUATION_JSON_CACHE_KEY] = situation_analysis_json
+
+        return self._impact_prefix + situation_analysis_json + self._impact_suffix
+
+    def _prompt_stage2(
+        self, state: Dict, include_reference: Optional[bool] = None
+    ) -> str:
+        """阶段3：响应计划提示，合并前两阶段的序列化结果。"""
+        current_state = state.get("state", {})
+        if not isinstance(current_state, dict):
+            self.logger.warning("无法从前一阶段获取状态信息")
+            current_state = {}
+        # 获取情景分析数据，优先复用解析阶段缓存的序列化结果
+        accident_info_json = current_state.get(_SITUATION_JSON_CACHE_KEY)
+        if accident_info_json is None:
+            accident_info_json = _dump_situation_json(current_state)
+            # 回填缓存，同一思想的后续阶段直接复用
+            current_state[_SITUATION_JSON_CACHE_KEY] = accident_info_json
+
+        # 格式化影响评估为JSON字符串，序列化结果随状态缓存，
+        # 同一思想的重试/评分不再重复dumps
+        impact_info_json = current_state.get(_IMPACT_JSON_CACHE_KEY)
+        if impact_info_json is None:
+            impact_info_json = _dumps_compact(
+                current_state.get("impact_assessment", {})
             )
-        
-        elif operation_index == 1:
-            # 阶段2：影响评估
-            # 尝试从前一阶段获取结果
-            try:
-                basic_info = current_state.get("basic_info", {})
-                accident_info = current_state.get("accident_info", {})
-                weather_conditions = current_state.get("weather_conditions", {})
-                geographical_info = current_state.get("geographical_info", {})
-                sensitive_targets = current_state.get("sensitive_targets", {})
-                
-                # 格式化前一阶段数据为JSON字符串用于提示
-                situation_analysis_json = json.dumps({
-                    "basic_info": basic_info,
-                    "accident_info": accident_info,
-                    "weather_conditions": weather_conditions, 
-                    "geographical_info": geographical_info,
-                    "sensitive_targets": sensitive_targets
-                }, ensure_ascii=False, indent=2)
-                
-                return self.impact_assessment_prompt.format(
-                    situation_analysis=situation_analysis_json
-                )
-            except Exception as e:
-                self.logger.warning("无法从前一阶段获取状态信息")
-                # 提供一个简单的基本提示，避免完全失败
-                return self.impact_assessment_prompt.format(
-                    situation_analysis="{}"
-                )
-        
-        elif operation_index == 2:
-            # 阶段3：响应计划
-            # 尝试从前两阶段获取结果
-            try:
-                # 获取情景分析数据
-                basic_info = current_state.get("basic_info", {})
-                accident_info = current_state.get("accident_info", {})
-                weather_conditions = current_state.get("weather_conditions", {})
-                geographical_info = current_state.get("geographical_info", {})
-                sensitive_targets = current_state.get("sensitive_targets", {})
-                
-                # 获取影响评估数据
-                impact_assessment = current_state.get("impact_assessment", {})
-                
-                # 格式化事故信息为JSON字符串
-                accident_info_json = json.dumps({
-                    "basic_info": basic_info,
-                    "accident_info": accident_info,
-                    "weather_conditions": weather_conditions,
-                    "geographical_info": geographical_info,
-                    "sensitive_targets": sensitive_targets
-                }, ensure_ascii=False, indent=2)
-                
-                # 格式化影响评估为JSON字符串
-                impact_info_json = json.dumps(impact_assessment, ensure_ascii=False, indent=2)
-                
-                return self.response_plan_prompt.format(
-                    accident_info=accident_info_json,
-                    impact_info=impact_info_json
-                )
-            except Exception as e:
-                self.logger.warning("无法从前一阶段获取状态信息")
-                # 提供一个简单的基本提示，避免完全失败
-                return self.response_plan_prompt.format(
-                    accident_info="{}",
-                    impact_info="{}"
-                )
-        
-        else:
-            # 未知阶段，返回默认提示
-            self.logger.warning(f"未知的操作索引: {operation_index}")
-            return "请分析这个化工应急事件。"
+            current_state[_IMPACT_JSON_CACHE_KEY] = impact_info_json
+
+        # 参考案例只在事故类型与案例领域（爆炸/火灾）匹配时才值得
+        # 花token附上；调用方可传include_reference显式覆盖
+        if include_reference is None:
+            include_reference = self._wants_reference_case(current_state)
+
+        return _render(
+            self._response_segments,
+            accident_info=accident_info_json,
+            impact_info=impact_info_json,
+            reference_case=self.reference_case_block if include_reference else "",
+        )
+
+    @staticmethod
+    def _wants_reference_case(current_state: Dict) -> bool:
+        """事故类型与参考案例领域（爆炸/火灾）匹配时返回True。"""
+        accident_info = current_state.get("accident_info")
+        accident_type = (
+            accident_info.get("type", "") if isinstance(accident_info, dict) else ""
+        )
+        return "爆炸" in accident_type or "火灾" in accident_type
 
     def improve_prompt(self, **kwargs) -> str:
         """
@@ -773,278 +1360,113 @@ class ChemicalEmergencyParser(parser.Parser):
     def __init__(self) -> None:
         """Initialize the ChemicalEmergencyParser."""
         super().__init__()
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
 
     def attempt_fix_truncated_json(self, json_text: str) -> str:
         """
         尝试修复被截断的JSON文本。
-        
+
+        repair_truncated_json的字符串形式包装，保留给需要JSON文本的
+        调用方；解析路径应直接用对象形式，避免dumps后再loads的往返。
+
         Args:
             json_text: 可能被截断的JSON文本
-            
+
         Returns:
             str: 修复后的JSON文本
         """
+        return _dumps_compact(self.repair_truncated_json(json_text))
+
+    def repair_truncated_json(self, json_text: str) -> Union[Dict, List]:
+        """
+        尝试修复被截断的JSON文本，直接返回解析后的对象。
+
+        修复过程本就要解析一次来验证结果，把对象直接交给调用方，
+        省去"序列化返回、调用方再反序列化"的一轮完整往返。
+
+        Args:
+            json_text: 可能被截断的JSON文本
+
+        Returns:
+            Union[Dict, List]: 修复并解析出的对象；彻底失败时为空字典
+        """
         try:
-            # 尝试直接解析，如果成功则无需修复
-            json.loads(json_text)
-            return json_text
-        except json.JSONDecodeError as e:
-            self.logger.warning(f"JSON解析错误，尝试修复: {str(e)}")
+            # raw_decode一次线性扫描定位首个完整JSON对象：合法输入直接
+            # 通过，夹带前后杂质（```围栏、附言）时顺带裁掉，都无需进入
+            # 正则修复路径
+            start = json_text.find('{')
+            if start == -1:
+                raise ValueError("文本中没有JSON对象")
+            parsed, _end = _DECODER.raw_decode(json_text, start)
+            return parsed
+        except ValueError as e:
+            self.logger.warning("JSON解析错误，尝试修复: %s", str(e))
             
-            # 1. 提取完整的部分字段 - 特别是对于响应计划
+            # 1. 提取完整的部分字段 - 特别是对于响应计划。
+            # 单趟扫描找出所有完整闭合的顶层值，只保留响应计划的已知键，
+            # 替代此前对同一文本逐键运行的十余个嵌套量词回溯正则
             complete_fields = {}
-            
-            # 尝试提取emergency_level字段
-            level_match = re.search(r'"emergency_level"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if level_match:
-                try:
-                    level_text = '{' + level_match.group(1) + '}'
-                    level_json = json.loads('{"emergency_level":' + level_text + '}')
-                    complete_fields.update(level_json)
-                    self.logger.info("成功提取emergency_level字段")
-                except:
-                    pass
-            
-            # 尝试提取evacuation_plan字段
-            evac_match = re.search(r'"evacuation_plan"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if evac_match:
+            failed_keys = []
+            # seen_keys顺带记录所有出现过的顶层键（含值被截断的），
+            # 兜底路径据此判断emergency_level是否出现，无需再扫全文
+            seen_keys: set = set()
+            for key, value_text in _scan_top_level(json_text, seen_keys).items():
+                if key not in _RESPONSE_PLAN_KEYSET:
+                    continue
                 try:
-                    evac_text = '{' + evac_match.group(1) + '}'
-                    evac_json = json.loads('{"evacuation_plan":' + evac_text + '}')
-                    complete_fields.update(evac_json)
-                    self.logger.info("成功提取evacuation_plan字段")
-                except:
+                    complete_fields[key] = _loads(value_text)
+                    self.logger.info("成功提取%s字段", key)
+                    continue
+                except (ValueError, json.JSONDecodeError):
                     pass
-            
-            # 尝试提取onsite_response字段
-            onsite_match = re.search(r'"onsite_response"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if onsite_match:
-                try:
-                    onsite_text = '{' + onsite_match.group(1) + '}'
-                    
-                    # 由于onsite_response通常包含嵌套结构，尝试更高级的修复
-                    onsite_text = re.sub(r',\s*}', '}', onsite_text)  # 移除尾部逗号
-                    onsite_text = re.sub(r'"\s*}', '"}', onsite_text)  # 修复引号后直接闭合
-                    
-                    # 修复嵌套的isolation_zone结构
-                    isolation_match = re.search(r'"isolation_zone"\s*:\s*{([^{}]*)}', onsite_text)
-                    if isolation_match:
-                        isolation_text = isolation_match.group(1)
-                        if isolation_text and not isolation_text.endswith('}'):
-                            fixed_isolation = isolation_text + '}'
-                            onsite_text = onsite_text.replace(isolation_text, fixed_isolation)
-                    
-                    # 修复嵌套的command_system结构
-                    command_match = re.search(r'"command_system"\s*:\s*{([^{}]*)}', onsite_text)
-                    if command_match:
-                        command_text = command_match.group(1)
-                        if command_text and not command_text.endswith('}'):
-                            fixed_command = command_text + '}'
-                            onsite_text = onsite_text.replace(command_text, fixed_command)
-                    
-                    onsite_json = json.loads('{"onsite_response":' + onsite_text + '}')
-                    complete_fields.update(onsite_json)
-                    self.logger.info("成功提取onsite_response字段")
-                except Exception as e:
-                    self.logger.warning(f"提取onsite_response失败: {str(e)}")
-                    # 简化提取尝试
-                    try:
-                        isolation_zone_match = re.search(r'"isolation_zone"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-                        if isolation_zone_match:
-                            isolation_text = '{' + isolation_zone_match.group(1) + '}'
-                            isolation_json = json.loads('{"isolation_zone":' + isolation_text + '}')
-                            if 'onsite_response' not in complete_fields:
-                                complete_fields['onsite_response'] = {}
-                            complete_fields['onsite_response'].update(isolation_json)
-                            self.logger.info("成功提取isolation_zone子字段")
-                    except:
-                        pass
-            
-            # 尝试提取medical_response字段
-            medical_match = re.search(r'"medical_response"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if medical_match:
-                try:
-                    medical_text = '{' + medical_match.group(1) + '}'
-                    
-                    # 由于medical_response通常包含嵌套结构，尝试更高级的修复
-                    medical_text = re.sub(r',\s*}', '}', medical_text)  # 移除尾部逗号
-                    medical_text = re.sub(r'"\s*}', '"}', medical_text)  # 修复引号后直接闭合
-                    
-                    # 修复嵌套的ambulance_standby结构
-                    ambulance_match = re.search(r'"ambulance_standby"\s*:\s*{([^{}]*)}', medical_text)
-                    if ambulance_match:
-                        ambulance_text = ambulance_match.group(1)
-                        if ambulance_text and not ambulance_text.endswith('}'):
-                            fixed_ambulance = ambulance_text + '}'
-                            medical_text = medical_text.replace(ambulance_text, fixed_ambulance)
-                    
-                    # 修复嵌套的specialist_team结构
-                    specialist_match = re.search(r'"specialist_team"\s*:\s*{([^{}]*)}', medical_text)
-                    if specialist_match:
-                        specialist_text = specialist_match.group(1)
-                        if specialist_text and not specialist_text.endswith('}'):
-                            fixed_specialist = specialist_text + '}'
-                            medical_text = medical_text.replace(specialist_text, fixed_specialist)
-                    
-                    medical_json = json.loads('{"medical_response":' + medical_text + '}')
-                    complete_fields.update(medical_json)
-                    self.logger.info("成功提取medical_response字段")
-                except Exception as e:
-                    self.logger.warning(f"提取medical_response失败: {str(e)}")
-                    # 简化提取尝试 - 提取triage_locations子字段
-                    try:
-                        triage_match = re.search(r'"triage_locations"\s*:\s*\[(.*?)\]', json_text)
-                        if triage_match:
-                            triage_text = triage_match.group(1)
-                            triage_list = json.loads('[' + triage_text + ']')
-                            if 'medical_response' not in complete_fields:
-                                complete_fields['medical_response'] = {}
-                            complete_fields['medical_response']['triage_locations'] = triage_list
-                            self.logger.info("成功提取triage_locations子字段")
-                    except:
-                        pass
-            
-            # 尝试提取environmental_monitoring字段
-            env_match = re.search(r'"environmental_monitoring"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if env_match:
+                # 清理常见截断伪影（尾逗号、引号后空白闭合）后重试，
+                # 两类伪影在一趟合并扫描里处理
+                cleaned = _RE_FIELD_CLEANUP.sub(_field_cleanup_repl, value_text)
                 try:
-                    env_text = '{' + env_match.group(1) + '}'
-                    env_text = re.sub(r',\s*}', '}', env_text)  # 移除尾部逗号
-                    env_text = re.sub(r'"\s*}', '"}', env_text)  # 修复引号后直接闭合
-                    
-                    env_json = json.loads('{"environmental_monitoring":' + env_text + '}')
-                    complete_fields.update(env_json)
-                    self.logger.info("成功提取environmental_monitoring字段")
-                except:
-                    pass
-                    
-            # 尝试提取resource_allocation字段
-            resource_match = re.search(r'"resource_allocation"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if resource_match:
-                try:
-                    resource_text = '{' + resource_match.group(1) + '}'
-                    resource_text = re.sub(r',\s*}', '}', resource_text)  # 移除尾部逗号
-                    resource_text = re.sub(r'"\s*}', '"}', resource_text)  # 修复引号后直接闭合
-                    
-                    resource_json = json.loads('{"resource_allocation":' + resource_text + '}')
-                    complete_fields.update(resource_json)
-                    self.logger.info("成功提取resource_allocation字段")
-                except Exception as e:
-                    self.logger.warning(f"提取resource_allocation失败: {str(e)}")
-                    # 提取紧急人员子字段
-                    try:
-                        personnel_match = re.search(r'"emergency_personnel"\s*:\s*{([^{}]*)}', json_text)
-                        if personnel_match:
-                            personnel_text = '{' + personnel_match.group(1) + '}'
-                            personnel_json = json.loads('{"emergency_personnel":' + personnel_text + '}')
-                            if 'resource_allocation' not in complete_fields:
-                                complete_fields['resource_allocation'] = {}
-                            complete_fields['resource_allocation'].update(personnel_json)
-                            self.logger.info("成功提取emergency_personnel子字段")
-                    except:
-                        pass
-            
-            # 尝试提取information_management字段
-            info_match = re.search(r'"information_management"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if info_match:
-                try:
-                    info_text = '{' + info_match.group(1) + '}'
-                    info_text = re.sub(r',\s*}', '}', info_text)  # 移除尾部逗号
-                    info_text = re.sub(r'"\s*}', '"}', info_text)  # 修复引号后直接闭合
-                    
-                    info_json = json.loads('{"information_management":' + info_text + '}')
-                    complete_fields.update(info_json)
-                    self.logger.info("成功提取information_management字段")
-                except Exception as e:
-                    self.logger.warning(f"提取information_management失败: {str(e)}")
-                    # 简化提取尝试
-                    try:
-                        notification_match = re.search(r'"notification_chain"\s*:\s*{([^{}]*)}', json_text)
-                        if notification_match:
-                            notification_text = '{' + notification_match.group(1) + '}'
-                            notification_json = json.loads('{"notification_chain":' + notification_text + '}')
-                            if 'information_management' not in complete_fields:
-                                complete_fields['information_management'] = {}
-                            complete_fields['information_management'].update(notification_json)
-                            self.logger.info("成功提取notification_chain子字段")
-                    except:
-                        pass
-            
-            # 尝试提取recovery_plan字段
-            recovery_match = re.search(r'"recovery_plan"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if recovery_match:
-                try:
-                    recovery_text = '{' + recovery_match.group(1) + '}'
-                    recovery_text = re.sub(r',\s*}', '}', recovery_text)  # 移除尾部逗号
-                    recovery_text = re.sub(r'"\s*}', '"}', recovery_text)  # 修复引号后直接闭合
-                    
-                    recovery_json = json.loads('{"recovery_plan":' + recovery_text + '}')
-                    complete_fields.update(recovery_json)
-                    self.logger.info("成功提取recovery_plan字段")
-                except Exception as e:
-                    self.logger.warning(f"提取recovery_plan失败: {str(e)}")
-                    # 简化提取尝试
-                    try:
-                        cleanup_match = re.search(r'"site_cleanup"\s*:\s*{([^{}]*)}', json_text)
-                        if cleanup_match:
-                            cleanup_text = '{' + cleanup_match.group(1) + '}'
-                            cleanup_json = json.loads('{"site_cleanup":' + cleanup_text + '}')
-                            if 'recovery_plan' not in complete_fields:
-                                complete_fields['recovery_plan'] = {}
-                            complete_fields['recovery_plan'].update(cleanup_json)
-                            self.logger.info("成功提取site_cleanup子字段")
-                    except:
-                        pass
-            
-            # 尝试提取secondary_disaster_prevention字段
-            prevention_match = re.search(r'"secondary_disaster_prevention"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if prevention_match:
-                try:
-                    prevention_text = '{' + prevention_match.group(1) + '}'
-                    prevention_text = re.sub(r',\s*}', '}', prevention_text)  # 移除尾部逗号
-                    prevention_text = re.sub(r'"\s*}', '"}', prevention_text)  # 修复引号后直接闭合
-                    
-                    prevention_json = json.loads('{"secondary_disaster_prevention":' + prevention_text + '}')
-                    complete_fields.update(prevention_json)
-                    self.logger.info("成功提取secondary_disaster_prevention字段")
-                except Exception as e:
-                    self.logger.warning(f"提取secondary_disaster_prevention失败: {str(e)}")
-                    # 简化提取尝试
-                    try:
-                        explosion_match = re.search(r'"explosion_prevention"\s*:\s*{([^{}]*)}', json_text)
-                        if explosion_match:
-                            explosion_text = '{' + explosion_match.group(1) + '}'
-                            explosion_json = json.loads('{"explosion_prevention":' + explosion_text + '}')
-                            if 'secondary_disaster_prevention' not in complete_fields:
-                                complete_fields['secondary_disaster_prevention'] = {}
-                            complete_fields['secondary_disaster_prevention'].update(explosion_json)
-                            self.logger.info("成功提取explosion_prevention子字段")
-                    except:
-                        pass
-            
-            # 尝试提取special_material_handling字段
-            material_match = re.search(r'"special_material_handling"\s*:\s*{([^{}]*({[^{}]*})*[^{}]*)}', json_text)
-            if material_match:
+                    complete_fields[key] = _loads(cleaned)
+                    self.logger.info("成功提取%s字段", key)
+                except (ValueError, json.JSONDecodeError):
+                    self.logger.warning("提取%s失败", key)
+                    failed_keys.append(key)
+
+            # 外层对象被截断（未闭合）的键不会出现在扫描结果里，
+            # 连同清理后仍解析失败的键一起尝试抢救其扁平子字段
+            salvage_keys = set(failed_keys)
+            salvage_keys.update(
+                key for key in _SUBFIELD_SALVAGE
+                if key not in complete_fields
+            )
+            for key in salvage_keys:
+                entry = _SUBFIELD_SALVAGE.get(key)
+                if entry is None:
+                    continue
+                subkey, probe, pattern, is_array = entry
+                # 子串探针先行：文本中没有该子字段时跳过正则启动开销
+                if probe not in json_text:
+                    continue
+                sub_match = pattern.search(json_text)
+                if sub_match is None:
+                    continue
+                fragment = sub_match.group(1)
                 try:
-                    material_text = '{' + material_match.group(1) + '}'
-                    material_text = re.sub(r',\s*}', '}', material_text)  # 移除尾部逗号
-                    material_text = re.sub(r'"\s*}', '"}', material_text)  # 修复引号后直接闭合
-                    
-                    material_json = json.loads('{"special_material_handling":' + material_text + '}')
-                    complete_fields.update(material_json)
-                    self.logger.info("成功提取special_material_handling字段")
-                except:
-                    pass
-            
+                    value = _loads(
+                        '[' + fragment + ']' if is_array else '{' + fragment + '}'
+                    )
+                except (ValueError, json.JSONDecodeError):
+                    continue
+                complete_fields.setdefault(key, {})[subkey] = value
+                self.logger.info("成功提取%s子字段", subkey)
+
             # 2. 如果提取到了至少一个完整字段，则返回这些字段组成的JSON
             if complete_fields:
-                self.logger.info(f"成功提取了 {len(complete_fields)} 个完整字段")
-                return json.dumps(complete_fields)
+                self.logger.info("成功提取了 %d 个完整字段", len(complete_fields))
+                return complete_fields
             
-            # 3. 如果无法提取完整字段，尝试基于括号平衡来修复
+            # 3. 如果无法提取完整字段，尝试基于括号平衡来修复。
+            # findall在C层先筛出括号字符，Python循环只处理括号本身
+            # 而非全文逐字符；栈序保留，补全顺序与嵌套层次一致
             brackets_stack = []
-            for i, char in enumerate(json_text):
+            for char in _RE_BRACKETS.findall(json_text):
                 if char == '{':
                     brackets_stack.append('}')
                 elif char == '[':
@@ -1059,30 +1481,23 @@ class ChemicalEmergencyParser(parser.Parser):
             while brackets_stack:
                 fixed_json += brackets_stack.pop()
             
-            # 替换常见的JSON格式错误
-            # 1. 多余的逗号
-            fixed_json = re.sub(r',\s*}', '}', fixed_json)
-            fixed_json = re.sub(r',\s*]', ']', fixed_json)
-            
-            # 2. 缺少逗号
-            fixed_json = re.sub(r'"\s*{', '",{', fixed_json)
-            fixed_json = re.sub(r'"\s*\[', '",[', fixed_json)
-            
-            # 3. 修复截断或不完整的键值对
-            fixed_json = re.sub(r'"([^"]+)"\s*:\s*(?!(true|false|null|\{|\[|"|\d))', r'"\1": "未知"', fixed_json)
+            # 替换常见的JSON格式错误：多余逗号与缺失逗号的四条规则
+            # 合并成一趟扫描，截断键值对的占位补全单独一趟
+            fixed_json = _RE_FALLBACK_CLEANUP.sub(_fallback_cleanup_repl, fixed_json)
+            fixed_json = _RE_MISSING_VALUE.sub(r'"\1": "未知"', fixed_json)
             
             try:
-                # 测试修复后的JSON是否可以解析
-                json.loads(fixed_json)
+                # 解析一次同时完成验证与返回值构造
+                repaired = _loads(fixed_json)
                 self.logger.info("JSON修复成功")
-                return fixed_json
+                return repaired
             except json.JSONDecodeError:
                 self.logger.error("JSON修复失败，返回基本结构")
-                
+
                 # 如果修复失败，返回之前提取的emergency_level或最基本的结构
-                if '"emergency_level"' in json_text:
-                    return '{"emergency_level":{"level":"I级","reason":"爆炸事故影响范围广泛"}}'
-                return '{}'
+                if "emergency_level" in seen_keys:
+                    return dict(_FALLBACK_LEVEL_OBJ)
+                return {}
 
     def validate_json_structure(self, json_data: Dict, operation_index: int) -> bool:
         """
@@ -1098,61 +1513,33 @@ class ChemicalEmergencyParser(parser.Parser):
         try:
             # 检查json_data是否为空
             if not json_data:
-                self.logger.warning(f"JSON数据为空")
+                self.logger.warning("JSON数据为空")
                 return False
-                
-            if operation_index == 0:
-                # 情景分析阶段 - 宽松验证
-                # 检查是否至少包含一些关键字段
-                basic_keys = ["basic_info", "accident_info", "weather_conditions", 
-                             "geographical_info", "sensitive_targets"]
-                
-                found_keys = [key for key in basic_keys if key in json_data]
-                if len(found_keys) >= 3:  # 至少需要3个主要部分
-                    self.logger.info(f"情景分析阶段验证通过，包含字段: {found_keys}")
-                    return True
-                else:
-                    self.logger.warning(f"影响评估阶段缺少太多必要键，仅找到: {found_keys}")
-                    return False
-
-            elif operation_index == 1:
-                # 影响评估阶段 - 宽松验证
-                # 检查是否包含关键部分
-                impact_keys = ["dispersion_prediction", "population_impact", 
-                              "environmental_impact", "secondary_disasters", "social_impact"]
-                
-                found_keys = [key for key in impact_keys if key in json_data]
-                if len(found_keys) >= 2:  # 至少需要2个关键部分
-                    self.logger.info(f"影响评估阶段验证通过，包含字段: {found_keys}")
-                    return True
-                else:
-                    self.logger.warning(f"影响评估缺少太多必要键，仅找到: {found_keys}")
-                    return False
-                
-            elif operation_index == 2:
-                # 响应计划阶段 - 更宽松的验证，接受部分数据
-                # 检查是否包含关键部分，即使只有几个键
-                plan_keys = ["emergency_level", "evacuation_plan", "onsite_response", 
-                            "medical_response", "environmental_monitoring", 
-                            "resource_allocation", "information_management", "recovery_plan"]
-                
-                found_keys = [key for key in plan_keys if key in json_data]
-                if len(found_keys) >= 1:  # 只需要1个关键部分即可接受
-                    self.logger.info(f"响应计划阶段验证通过，包含字段: {found_keys}")
-                    return True
-                else:
-                    self.logger.warning(f"响应计划缺少所有必要键")
-                    return False
-            
-            else:
+
+            if not 0 <= operation_index < len(_STAGE_KEYS):
                 # 未知操作索引，默认通过
-                self.logger.warning(f"未知操作索引{operation_index}的验证，默认通过")
+                self.logger.warning("未知操作索引%s的验证，默认通过", operation_index)
                 return True
-                
-        except Exception as e:
-            self.logger.error(f"验证JSON结构时出错: {str(e)}")
-            import traceback
-            self.logger.error(traceback.format_exc())
+
+            # 宽松验证：frozenset交集统计命中的关键字段数，达到阈值即通过
+            found_keys = _STAGE_KEYS[operation_index] & json_data.keys()
+            if len(found_keys) >= _STAGE_MIN[operation_index]:
+                self.logger.info(
+                    "%s阶段验证通过，包含字段: %s",
+                    _STAGE_NAMES[operation_index], sorted(found_keys)
+                )
+                return True
+            else:
+                self.logger.warning(
+                    "%s阶段缺少太多必要键，仅找到: %s",
+                    _STAGE_NAMES[operation_index], sorted(found_keys)
+                )
+                return False
+
+
+        except Exception:
+            # logger.exception仅在处理器真正输出时才格式化堆栈
+            self.logger.exception("验证JSON结构时出错")
             return False
 
     def parse_aggregation_answer(
@@ -1171,6 +1558,60 @@ class ChemicalEmergencyParser(parser.Parser):
         # Implement if aggregation is needed
         return {"state": states[0]["state"]} if states else {}
 
+    def _parse_batch_array(self, thought: Dict, text: str, operation_index: int) -> List[Dict]:
+        """
+        解析批量模式下返回的顶层JSON数组，并将每个元素展开为一个新思想。
+
+        Args:
+            thought: 当前思想状态
+            text: 包含JSON数组的响应文本
+            operation_index: 操作索引
+
+        Returns:
+            List[Dict]: 展开后的新思想状态列表，解析失败时为空列表
+        """
+        start_idx = text.find('[')
+        end_idx = text.rfind(']')
+        if start_idx == -1 or end_idx == -1:
+            return []
+
+        try:
+            items = _loads(text[start_idx:end_idx + 1])
+        except json.JSONDecodeError as e:
+            self.logger.warning("批量JSON数组解析失败: %s", str(e))
+            return []
+
+        if not isinstance(items, list):
+            return []
+
+        # 批量模式下原始事故描述列表保存在batch_inputs中
+        batch_inputs = thought.get("batch_inputs", [])
+        batch_thoughts = []
+
+        for position, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                self.logger.warning("批量结果第 %d 个元素不是JSON对象，已跳过", position)
+                continue
+
+            # index字段标明该结果对应的事故编号
+            index = item.pop("index", position)
+            if not isinstance(index, int):
+                index = position
+
+            if not self.validate_json_structure(item, operation_index):
+                self.logger.warning("批量结果中事故[%s]未通过验证", index)
+                continue
+
+            new_thought = thought.copy()
+            new_thought["state"] = item
+            new_thought["operation_index"] = operation_index + 1
+            if 0 < index <= len(batch_inputs):
+                new_thought["input_text"] = batch_inputs[index - 1]
+            batch_thoughts.append(new_thought)
+
+        self.logger.info("批量模式：从数组中展开了 %d 个思想", len(batch_thoughts))
+        return batch_thoughts
+
     def parse_generate_answer(self, thought: Dict, texts: List[str]) -> List[Dict]:
         """
         解析生成操作的响应。
@@ -1185,120 +1626,144 @@ class ChemicalEmergencyParser(parser.Parser):
         new_thoughts = []
         operation_index = thought.get("operation_index", 0)
         input_text = thought.get("input_text", "")
+        # 循环不变量提到响应循环外：同一思想的所有响应共享前序状态
+        # 与下一阶段索引，多响应(num_responses>1)时不再逐次重新取值
+        base_state = thought.get("state", {})
+        next_index = operation_index + 1
 
         for text in texts:
             try:
                 # 尝试解析响应为JSON
                 response_json = {}
                 text = text.strip()
-                
-                # 提取JSON部分
-                start_idx = text.find('{')
-                end_idx = text.rfind('}')
+
+                # 批量模式：模型返回顶层JSON数组，每个元素对应一起事故
+                arr_idx = text.find('[')
+                obj_idx = text.find('{')
+                if arr_idx != -1 and (obj_idx == -1 or arr_idx < obj_idx):
+                    batch_thoughts = self._parse_batch_array(thought, text, operation_index)
+                    if batch_thoughts:
+                        new_thoughts.extend(batch_thoughts)
+                        continue
+
+                # 提取JSON部分：复用上面的扫描结果，避免对长响应再做一次
+                # 前向扫描；反向扫描也从start_idx截止，不越过对象起点
+                start_idx = obj_idx
+                end_idx = text.rfind('}', start_idx) if start_idx != -1 else -1
                 
                 if start_idx != -1 and end_idx != -1:
                     json_text = text[start_idx:end_idx+1]
                     try:
-                        # 尝试修复和解析JSON
-                        fixed_json_text = self.attempt_fix_truncated_json(json_text)
-                        response_json = json.loads(fixed_json_text)
-                        self.logger.info(f"成功解析JSON响应: {json_text[:100]}...")
+                        # 最快路径：阶段模式已知时，pydantic的Rust解码器一次
+                        # 扫描同时完成解析与顶层键类型校验；校验失败再退回
+                        # 通用解析路径，宽松的字段数阈值仍由后续验证负责
+                        response_json = None
+                        if _STAGE_MODELS is not None and 0 <= operation_index < len(_STAGE_MODELS):
+                            try:
+                                response_json = _STAGE_MODELS[operation_index].model_validate_json(
+                                    json_text
+                                ).model_dump(exclude_none=True)
+                            except pydantic.ValidationError:
+                                response_json = None
+                        if response_json is None:
+                            # 快速路径：raw_decode一次扫描定位首个完整JSON对象，
+                            # 不依赖rfind('}')启发式，格式良好的响应无需进入修复逻辑
+                            try:
+                                response_json, _ = _DECODER.raw_decode(text, start_idx)
+                            except ValueError:
+                                # 修复并直接取回解析后的对象，跳过二次loads
+                                response_json = self.repair_truncated_json(json_text)
+                        self.logger.info("成功解析JSON响应: %.100s...", json_text)
                     except json.JSONDecodeError as e:
-                        self.logger.error(f"JSON解析错误，即使尝试修复后: {str(e)}")
-                        self.logger.error(f"尝试解析的文本: {json_text[:100]}...")
+                        self.logger.error("JSON解析错误，即使尝试修复后: %s", str(e))
+                        self.logger.error("尝试解析的文本: %.100s...", json_text)
                         
                         # 对于响应计划阶段，即使JSON无法完全解析，也尝试创建部分响应
                         if operation_index == 2:
                             # 从文本中提取可能的紧急等级信息
-                            emergency_level_match = re.search(r'"emergency_level"\s*:\s*{([^}]+)}', json_text)
+                            emergency_level_match = _RE_EMERGENCY_LEVEL.search(json_text)
                             if emergency_level_match:
                                 try:
                                     emergency_level_text = '{' + emergency_level_match.group(1) + '}'
                                     emergency_level_text = emergency_level_text.replace('""', '"未知"')
-                                    emergency_level = json.loads('{"emergency_level":' + emergency_level_text + '}')
+                                    emergency_level = _loads('{"emergency_level":' + emergency_level_text + '}')
                                     response_json = emergency_level
                                     self.logger.info("成功提取紧急等级信息")
                                 except:
-                                    response_json = {"emergency_level": {"level": "I级", "reason": "爆炸事故影响范围广泛"}}
+                                    response_json = dict(_FALLBACK_LEVEL_OBJ)
                             else:
-                                response_json = {"emergency_level": {"level": "I级", "reason": "爆炸事故影响范围广泛"}}
+                                response_json = dict(_FALLBACK_LEVEL_OBJ)
                         else:
                             continue
                 else:
-                    self.logger.error(f"无法在文本中找到JSON: {text[:100]}...")
+                    self.logger.error("无法在文本中找到JSON: %.100s...", text)
                     if operation_index == 2:
                         # 对于响应计划阶段，提供一个基本结构
-                        response_json = {"emergency_level": {"level": "I级", "reason": "爆炸事故影响范围广泛"}}
+                        response_json = dict(_FALLBACK_LEVEL_OBJ)
                     else:
                         continue
 
-                # 创建新状态
-                new_thought = thought.copy()
-                
-                # 根据操作索引处理不同阶段的响应
+                # 根据操作索引处理不同阶段的响应，确定新状态
                 if operation_index == 0:
                     # 情景分析阶段
-                    if self.validate_json_structure(response_json, 0):
-                        new_thought["state"] = response_json
-                        self.logger.info(f"情景分析阶段：成功验证并保存状态")
-                    else:
+                    if not self.validate_json_structure(response_json, 0):
                         self.logger.warning("情景分析结果未通过验证")
                         continue
-                
+                    # 缓存序列化结果，后续两个阶段的提示直接复用，
+                    # 不再对同一份情景分析数据重复json.dumps
+                    response_json[_SITUATION_JSON_CACHE_KEY] = _dump_situation_json(response_json)
+                    new_state = response_json
+                    self.logger.info("情景分析阶段：成功验证并保存状态")
+
                 elif operation_index == 1:
                     # 影响评估阶段 - 前一阶段结果可能在thought["state"]中
-                    if self.validate_json_structure(response_json, 1):
-                        # 获取前一阶段的状态
-                        prev_state = thought.get("state", {})
-                        
-                        # 确保我们在新状态中保留前一阶段的数据
-                        new_thought["state"] = prev_state.copy()  # 复制前一阶段的整个状态
-                        new_thought["state"]["impact_assessment"] = response_json
-                        self.logger.info(f"影响评估阶段：成功验证并保存状态")
-                    else:
+                    if not self.validate_json_structure(response_json, 1):
                         self.logger.warning("影响评估结果未通过验证")
                         continue
-                
+                    # 单次字典构造即保留前一阶段数据并写入本阶段结果
+                    new_state = {
+                        **base_state,
+                        "impact_assessment": response_json,
+                    }
+                    self.logger.info("影响评估阶段：成功验证并保存状态")
+
                 elif operation_index == 2:
-                    # 响应计划阶段
+                    # 响应计划阶段；验证失败但含紧急等级时仍保存部分数据
                     if self.validate_json_structure(response_json, 2):
-                        # 获取前一阶段的状态
-                        prev_state = thought.get("state", {})
-                        
-                        # 确保我们在新状态中保留前两阶段的数据
-                        new_thought["state"] = prev_state.copy()  # 复制前面阶段的整个状态
-                        new_thought["state"]["response_plan"] = response_json
-                        self.logger.info(f"响应计划阶段：成功验证并保存状态")
+                        self.logger.info("响应计划阶段：成功验证并保存状态")
+                    elif "emergency_level" in response_json:
+                        self.logger.warning("响应计划结果未通过验证")
+                        self.logger.info("保存了部分响应计划数据")
                     else:
                         self.logger.warning("响应计划结果未通过验证")
-                        # 对于响应计划阶段，即使验证失败也保存基本信息
-                        if "emergency_level" in response_json:
-                            prev_state = thought.get("state", {})
-                            new_thought["state"] = prev_state.copy()
-                            new_thought["state"]["response_plan"] = response_json
-                            self.logger.info("保存了部分响应计划数据")
-                        else:
-                            continue
-                
-                # 更新操作索引为下一阶段
-                new_thought["operation_index"] = operation_index + 1
-                # 确保保留原始输入文本
-                new_thought["input_text"] = input_text
-                
-                # 添加到结果列表
-                new_thoughts.append(new_thought)
+                        continue
+                    new_state = {
+                        **base_state,
+                        "response_plan": response_json,
+                    }
+
+                else:
+                    new_state = base_state
+
+                # 单次字典字面量构造新思想：合并原思想的其余键、推进操作
+                # 索引并写入新状态，替代copy()后逐键覆写的多次遍历
+                new_thoughts.append({
+                    **thought,
+                    "operation_index": next_index,
+                    "input_text": input_text,
+                    "state": new_state,
+                })
                 
-            except Exception as e:
-                self.logger.error(f"解析生成响应时出错: {str(e)}")
-                import traceback
-                self.logger.error(traceback.format_exc())
-                self.logger.error(f"原始响应: {text[:100]}...")
+            except Exception:
+                # logger.exception仅在处理器真正输出时才格式化堆栈
+                self.logger.exception("解析生成响应时出错")
+                self.logger.error("原始响应: %.100s...", text)
         
         if not new_thoughts:
-            self.logger.warning(f"操作 {operation_index} 没有生成有效的思路")
+            self.logger.warning("操作 %s 没有生成有效的思路", operation_index)
             # 创建一个基本状态以继续执行
             basic_thought = thought.copy()
-            basic_thought["operation_index"] = operation_index + 1
+            basic_thought["operation_index"] = next_index
             # 确保保留原始输入文本
             basic_thought["input_text"] = input_text
             if "state" not in basic_thought:
@@ -1349,6 +1814,28 @@ class ChemicalEmergencyParser(parser.Parser):
         # Implement if scoring is needed
         return [1.0] * len(states)
 
+# validate_input要求的关键信息类别及其触发关键词
+_REQUIRED_INFO = {
+    "时间": ["年", "月", "日", "点"],
+    "位置": ["省", "市", "区", "厂"],
+    "事故": ["事故", "泄漏", "泄露"],
+    "天气": ["天气", "晴", "阴", "雨"],
+    "温度": ["温度", "℃"],
+    "风": ["风"],
+    "距离": ["距离", "公里", "米"],
+    "化学品": ["化学品", "氯气"]
+}
+
+# 关键词→信息类别的反向映射，配合单个合并模式一次扫描完成全部匹配，
+# 替代对输入文本的20余次独立子串搜索（长关键词优先，避免被短关键词遮蔽）
+_KEYWORD_TO_INFO = {
+    keyword: key for key, keywords in _REQUIRED_INFO.items() for keyword in keywords
+}
+_KEYWORD_RE = re.compile(
+    "|".join(map(re.escape, sorted(_KEYWORD_TO_INFO, key=len, reverse=True)))
+)
+
+
 def validate_input(input_text: str) -> bool:
     """
     验证输入文本是否包含所需信息。
@@ -1358,26 +1845,15 @@ def validate_input(input_text: str) -> bool:
     :return: 如果有效返回True，否则返回False。
     :rtype: bool
     """
-    required_info = {
-        "时间": ["年", "月", "日", "点"],
-        "位置": ["省", "市", "区", "厂"],
-        "事故": ["事故", "泄漏", "泄露"],
-        "天气": ["天气", "晴", "阴", "雨"],
-        "温度": ["温度", "℃"],
-        "风": ["风"],
-        "距离": ["距离", "公里", "米"],
-        "化学品": ["化学品", "氯气"]
+    found_keys = {
+        _KEYWORD_TO_INFO[match.group()] for match in _KEYWORD_RE.finditer(input_text)
     }
-    
-    missing_info = []
-    for key, keywords in required_info.items():
-        if not any(keyword in input_text for keyword in keywords):
-            missing_info.append(key)
-    
+    missing_info = [key for key in _REQUIRED_INFO if key not in found_keys]
+
     if missing_info:
-        logging.getLogger(__name__).warning(f"缺少必要信息: {', '.join(missing_info)}")
+        logger.warning("缺少必要信息: %s", ", ".join(missing_info))
         return False
-    
+
     return True
 
 def create_operations_graph(input_text: str) -> controller.Controller:
@@ -1395,7 +1871,7 @@ def create_operations_graph(input_text: str) -> controller.Controller:
         def __init__(self, operation_index=0, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self.operation_index = operation_index
-            self.logger = logging.getLogger(__name__)
+            self.logger = logger
         
         def _execute(self, lm, prompter, parser, **kwargs):
             """
@@ -1413,7 +1889,9 @@ def create_operations_graph(input_text: str) -> controller.Controller:
             if "input_text" not in kwargs:
                 kwargs["input_text"] = input_text
             
-            self.logger.info(f"执行操作类型 {self.__class__.__name__}，操作索引: {self.operation_index}")
+            self.logger.info(
+                "执行操作类型 %s，操作索引: %s", self.__class__.__name__, self.operation_index
+            )
             
             # 获取前序思想
             previous_thoughts = self.get_previous_thoughts()
@@ -1424,26 +1902,79 @@ def create_operations_graph(input_text: str) -> controller.Controller:
             if len(previous_thoughts) == 0:
                 # 没有前序操作，使用kwargs作为基础状态
                 previous_thoughts = [operations.Thought(state=kwargs)]
-                
-            for thought in previous_thoughts:
-                # 获取基础状态
-                base_state = thought.state
-                # 调用prompter生成提示
-                prompt = prompter.generate_prompt(state=base_state, operation_index=self.operation_index)
-                self.logger.debug(f"为LM生成的提示: {prompt}")
-                
-                # 查询语言模型
-                responses = lm.get_response_texts(
-                    lm.query(prompt, num_responses=self.num_branches_response)
-                )
-                self.logger.debug(f"LM的响应: {responses}")
-                
-                # 解析响应
-                new_states = parser.parse_generate_answer(thought.state, responses)
-                
-                # 创建新思想
+
+            # 各前序思想之间相互独立，并发查询语言模型
+            asyncio.run(self._execute_async(previous_thoughts, lm, prompter, parser))
+
+        async def _execute_async(self, previous_thoughts, lm, prompter, parser):
+            """
+            并发执行所有前序思想的生成操作。
+
+            每个前序思想对应一次独立的LLM往返，彼此之间没有数据依赖，
+            因此通过asyncio.gather并发执行，单阶段耗时从N次往返降为约1次往返。
+
+            Args:
+                previous_thoughts: 前序思想列表
+                lm: 语言模型
+                prompter: 提示生成器
+                parser: 解析器
+            """
+            tasks = [
+                asyncio.ensure_future(self._run_one(thought, lm, prompter, parser))
+                for thought in previous_thoughts
+            ]
+            results = await asyncio.gather(*tasks)
+
+            # 按照前序思想的顺序创建新思想
+            for new_states in results:
                 for new_state in new_states:
                     self.thoughts.append(operations.Thought(new_state))
+
+        async def _run_one(self, thought, lm, prompter, parser):
+            """
+            为单个思想生成提示、查询语言模型并解析响应。
+
+            Args:
+                thought: 前序思想
+                lm: 语言模型
+                prompter: 提示生成器
+                parser: 解析器
+
+            Returns:
+                List[Dict]: 解析出的新思想状态列表
+            """
+            # 获取基础状态
+            base_state = thought.state
+
+            # 响应缓存：相同阶段+相同输入+相同前序状态直接复用LLM响应文本
+            cache_key = _response_cache_key(
+                self.operation_index,
+                base_state.get("input_text", ""),
+                base_state.get("state", {}),
+            )
+            responses = _RESPONSE_CACHE.get(cache_key)
+            if responses is not None:
+                _RESPONSE_CACHE.move_to_end(cache_key)
+                self.logger.info("响应缓存命中，操作索引: %s", self.operation_index)
+            else:
+                # 调用prompter生成system/user两段式消息，静态指令前缀可命中供应商端前缀缓存
+                prompt = prompter.generate_messages(state=base_state, operation_index=self.operation_index)
+                self.logger.debug("为LM生成的提示: %s", prompt)
+
+                # 查询语言模型（后端接口是同步的，放入线程池以免阻塞事件循环）
+                loop = asyncio.get_event_loop()
+                query_response = await loop.run_in_executor(
+                    None,
+                    functools.partial(lm.query, prompt, num_responses=self.num_branches_response),
+                )
+                responses = lm.get_response_texts(query_response)
+                _RESPONSE_CACHE[cache_key] = responses
+                if len(_RESPONSE_CACHE) > _RESPONSE_CACHE_MAX:
+                    _RESPONSE_CACHE.popitem(last=False)
+            self.logger.debug("LM的响应: %s", responses)
+
+            # 解析响应
+            return parser.parse_generate_answer(thought.state, responses)
     
     # 创建 LLM 后端
     config_path = os.path.join(
@@ -1508,6 +2039,76 @@ def create_operations_graph(input_text: str) -> controller.Controller:
     
     return controller_instance
 
+async def run_many(incidents: List[str], max_concurrent: int = 8) -> List[Dict]:
+    """
+    以阶段为单位流水线式地批量处理多起事故。
+
+    单起事故的三个阶段之间存在数据依赖，但不同事故之间相互独立。
+    因此对N起事故先并发执行所有阶段0，再阶段1，再阶段2——每个阶段
+    一次性向LLM后端提交N个请求，让支持连续批处理的后端获得足够深的
+    请求队列，吞吐量随后端批处理能力近线性扩展。
+
+    Args:
+        incidents: 事故描述文本列表
+        max_concurrent: 同时在途的LLM请求数上限
+
+    Returns:
+        List[Dict]: 每起事故的最终思想状态，顺序与输入一致
+    """
+    config_path = os.path.join(
+        os.path.dirname(__file__),
+        "../../graph_of_thoughts/language_models/config.json",
+    )
+    lm = language_models.ChatGPT(config_path, model_name="chatgpt", cache=True)
+    emergency_prompter = ChemicalEmergencyPrompter()
+    emergency_parser = ChemicalEmergencyParser()
+
+    semaphore = asyncio.Semaphore(max_concurrent)
+    loop = asyncio.get_event_loop()
+
+    async def _run_stage(thought_state: Dict, operation_index: int) -> Dict:
+        """执行单起事故的一个阶段，失败时原样返回当前状态。"""
+        messages = emergency_prompter.generate_messages(
+            state=thought_state, operation_index=operation_index
+        )
+        async with semaphore:
+            query_response = await loop.run_in_executor(
+                None, functools.partial(lm.query, messages, num_responses=1)
+            )
+        responses = lm.get_response_texts(query_response)
+        new_states = emergency_parser.parse_generate_answer(thought_state, responses)
+        return new_states[0] if new_states else thought_state
+
+    # 归一化去重：数据集中大量事故只在空白、大小写等无关紧要处不同，
+    # 相同归一化文本的事故只走一遍三阶段流水线，结果按原始顺序扇出
+    unique_index: Dict[str, int] = {}
+    position_map: List[int] = []
+    unique_incidents: List[str] = []
+    for incident in incidents:
+        key = _normalize_text(incident)
+        index = unique_index.get(key)
+        if index is None:
+            index = unique_index[key] = len(unique_incidents)
+            unique_incidents.append(incident)
+        position_map.append(index)
+    if len(unique_incidents) < len(incidents):
+        logger.info(
+            "输入去重：%d 起事故中有 %d 起唯一", len(incidents), len(unique_incidents)
+        )
+
+    states = [
+        {"input_text": incident, "operation_index": 0, "state": {}}
+        for incident in unique_incidents
+    ]
+    for operation_index in range(3):
+        logger.info("批量执行阶段 %s，共 %d 起事故", operation_index, len(states))
+        states = await asyncio.gather(
+            *[_run_stage(state, operation_index) for state in states]
+        )
+
+    return [states[index] for index in position_map]
+
+
 def process_results(result: List[Dict]) -> EmergencyResponse:
     """
     Process and validate the results from the GOT system.
@@ -1526,91 +2127,183 @@ def process_results(result: List[Dict]) -> EmergencyResponse:
         response_plan=result[2]["state"]
     )
 
+def _dump_json_file(obj, path: str) -> None:
+    """
+    将对象以缩进JSON一次性写入文件。
+
+    orjson在Rust侧遍历整棵对象树并直接产出UTF-8字节，避免stdlib
+    json.dump增量编码器的大量小块写入；default=str兜底datetime等
+    非JSON原生类型。环境缺orjson时回退stdlib实现。
+    """
+    if orjson is not None:
+        data = orjson.dumps(
+            obj, default=str,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+        )
+    else:
+        data = json.dumps(
+            obj, ensure_ascii=False, indent=2, default=str
+        ).encode("utf-8")
+    # 绕过TextIOWrapper/BufferedWriter，整块字节一次write系统调用写入
+    # 临时文件，fsync后原子rename替换目标，进程被杀也不会留下半截JSON
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+
+def _strip_private_keys(obj):
+    """
+    递归剥除_PRIVATE_STATE_KEYS中的键，返回可持久化的副本。
+
+    这些键是提示/解析阶段写进思想状态的进程内序列化缓存，会随状态
+    嵌套进各阶段结果；落盘前去掉它们，避免输出文件里混入重复的序列化
+    大字符串。
+
+    Args:
+        obj: 任意待持久化的JSON兼容结构
+
+    Returns:
+        去掉缓存键的副本；标量原样返回
+    """
+    if isinstance(obj, dict):
+        return {
+            k: _strip_private_keys(v)
+            for k, v in obj.items()
+            if k not in _PRIVATE_STATE_KEYS
+        }
+    if isinstance(obj, list):
+        return [_strip_private_keys(v) for v in obj]
+    return obj
+
+
+def _persist_results(response: Dict, all_results: Dict) -> None:
+    """
+    将应急响应方案与全阶段调试数据写入磁盘。
+
+    save_results与main()共用的保存出口：方案文件与调试文件各写一次，
+    序列化走_dump_json_file的单次写入+原子替换路径。写入前统一剥除
+    _PRIVATE_STATE_KEYS，进程内的序列化缓存不落盘。
+    """
+    response = _strip_private_keys(response)
+    all_results = _strip_private_keys(all_results)
+    output_file = "examples/chemical_emergency/emergency_response_plan.json"
+    try:
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        _dump_json_file(response, output_file)
+
+        # 按阶段键显式计数：response中可能混有error占位等额外条目，
+        # len()会把它们也算成完成的阶段
+        completed_phases = sum(
+            1 for key in _PHASE_NAMES if response.get(key) is not None
+        )
+        if completed_phases == 3:
+            logger.info("完整的应急响应方案已保存到 %s", output_file)
+        else:
+            logger.warning(
+                "不完整的应急响应已保存到 %s。只完成了 %d/3 个阶段。",
+                output_file, completed_phases,
+            )
+    except Exception:
+        logger.exception("保存结果到文件时出错")
+
+    # 包含所有三个阶段结果的调试文件
+    debug_file = "examples/chemical_emergency/debug_all_results.json"
+    try:
+        os.makedirs(os.path.dirname(debug_file), exist_ok=True)
+        _dump_json_file(all_results, debug_file)
+        logger.info("所有阶段结果已保存到 %s", debug_file)
+    except Exception:
+        logger.exception("保存调试结果时出错")
+
+
 def save_results(results, output_file="emergency_response_plan.json"):
     """将结果保存到文件。"""
     if not results:
-        logging.warning("没有结果可保存")
+        logger.warning("没有结果可保存")
         return
-    
-    logger = logging.getLogger(__name__)
-    
+
     # 创建存储每个阶段结果的字典
     response = {}
-    phase_names = ["situation_analysis", "impact_assessment", "response_plan"]
-    
-    # 收集已完成阶段的结果
-    completed_phases = 0
+    phase_names = _PHASE_NAMES
     
     # 检查获得了多少个阶段的结果
-    logger.info(f"获得了 {len(results)} 个阶段的结果")
+    logger.info("获得了 %d 个阶段的结果", len(results))
     
     # 处理每个阶段的结果
     for i, phase_thoughts in enumerate(results):
         if i >= len(phase_names):
             break
             
-        if phase_thoughts and len(phase_thoughts) > 0:
+        if phase_thoughts:
             try:
                 # 获取该阶段最后一个思路的状态
                 last_thought = phase_thoughts[-1]
-                logger.info(f"处理阶段 {i} ({phase_names[i]}) 的结果")
+                logger.info("处理阶段 %d (%s) 的结果", i, phase_names[i])
                 
                 if "state" in last_thought.state:
                     # 直接使用状态
                     response[phase_names[i]] = last_thought.state["state"]
-                    logger.info(f"阶段 {i} 的状态包含在 'state' 字段中")
+                    logger.info("阶段 %d 的状态包含在 'state' 字段中", i)
                 else:
                     # 将整个状态作为结果
                     response[phase_names[i]] = last_thought.state
-                    logger.info(f"阶段 {i} 使用完整状态作为结果")
+                    logger.info("阶段 %d 使用完整状态作为结果", i)
                 
-                # 标记阶段完成
-                completed_phases += 1
-                logger.info(f"成功提取阶段 {i} ({phase_names[i]}) 的结果")
+                logger.info("成功提取阶段 %d (%s) 的结果", i, phase_names[i])
             except Exception as e:
-                logger.error(f"提取阶段 {i} 结果时出错: {str(e)}")
-                import traceback
-                logger.error(traceback.format_exc())
+                logger.exception("提取阶段 %s 结果时出错", i)
                 response[phase_names[i]] = {"error": f"无法提取结果: {str(e)}"}
+                # 日志已带堆栈，断开引用让帧内存尽早被回收
+                e.__traceback__ = None
     
-    # 保存结果
-    output_file = "examples/chemical_emergency/emergency_response_plan.json"
-    try:
-        # 确保目录存在
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(response, f, ensure_ascii=False, indent=2)
-        
-        completed_phases = len(response)
-        if completed_phases == 3:
-            logger.info(f"完整的应急响应方案已保存到 {output_file}")
-        else:
-            logger.warning(f"不完整的应急响应已保存到 {output_file}。只完成了 {completed_phases}/3 个阶段。")
-    except Exception as e:
-        logger.error(f"保存结果到文件时出错: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-        
-    # 创建一个包含所有三个阶段结果的调试文件
-    debug_file = "examples/chemical_emergency/debug_all_results.json"
-    
-    try:
-        # 确保目录存在
-        os.makedirs(os.path.dirname(debug_file), exist_ok=True)
-        
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            json.dump(all_results, f, ensure_ascii=False, indent=2)
-        logger.info(f"所有阶段结果已保存到 {debug_file}")
-    except Exception as e:
-        logger.error(f"保存调试结果时出错: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+    # 调试数据沿用main()的投影：每阶段末思想的状态去掉graph键。
+    # 此前这里引用了未定义的all_results，调试文件保存必然抛NameError
+    all_results = {
+        f"phase_{i}": {
+            k: v for k, v in phase_thoughts[-1].state.items() if k != "graph"
+        }
+        for i, phase_thoughts in enumerate(results)
+        if phase_thoughts
+    }
+
+    _persist_results(response, all_results)
+
+class _BufferedFileHandler(logging.StreamHandler):
+    """
+    带64KB用户态缓冲的文件日志处理器。
+
+    普通FileHandler每条记录都触发一次write系统调用，慢速文件系统上会
+    阻塞主线程。这里INFO级记录先在缓冲区合并成大块写入，WARNING及以上
+    立即flush保证错误不丢失，进程退出时由atexit兜底flush。
+    """
+
+    def __init__(self, filename: str) -> None:
+        stream = open(filename, "a", buffering=64 * 1024, encoding="utf-8")
+        super().__init__(stream)
+        atexit.register(self.flush)
 
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.WARNING:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+@functools.lru_cache(maxsize=1)
 def setup_logging() -> logging.Logger:
     """
     Set up logging configuration.
 
+    缓存配置结果：批量驱动下重复进入main()时不再重新解析格式串、
+    重建处理器，直接返回已配置的logger。
+
     :return: Configured logger instance.
     :rtype: logging.Logger
     """
@@ -1618,91 +2311,64 @@ def setup_logging() -> logging.Logger:
         level=logging.INFO,
         format="%(asctime)s [%(levelname)s] %(message)s",
         handlers=[
-            logging.FileHandler("chemical_emergency.log"),
+            _BufferedFileHandler("chemical_emergency.log"),
             logging.StreamHandler()
         ]
     )
     return logging.getLogger(__name__)
 
+
+
+# 表驱动的阶段结果提取：(结果键, 候选阶段键, 提取函数, 日志消息)。
+# 后两个阶段的结果可能落在更早的phase状态里，按候选顺序取第一个命中
+_PHASE_EXTRACTORS = (
+    (
+        "situation_analysis",
+        ("phase_0",),
+        lambda state: {k: state[k] for k in _SITUATION_KEYS if k in state},
+        "成功提取情景分析阶段的结果",
+    ),
+    (
+        "impact_assessment",
+        ("phase_1", "phase_0"),
+        lambda state: state.get("impact_assessment"),
+        "成功提取影响评估阶段的结果",
+    ),
+    (
+        "response_plan",
+        ("phase_2", "phase_1", "phase_0"),
+        lambda state: state.get("response_plan"),
+        "成功提取响应计划阶段的结果",
+    ),
+)
+
+
+# 示例输入文本存放在同目录的scenario.txt中：数据与代码分离，替换事故
+# 场景时无需改动Python源码，模块体也不再携带这份数KB的字符串常量
+_SCENARIO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenario.txt")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_default_input_text() -> str:
+    """
+    读取默认事故场景文本。
+
+    Returns:
+        str: scenario.txt的完整内容，首次读取后缓存
+    """
+    with open(_SCENARIO_PATH, "r", encoding="utf-8") as f:
+        return f.read()
+
+
 def main():
     """
     运行化工应急响应系统的主函数。
     """
-    setup_logging()
-    logger = logging.getLogger(__name__)
+    logger = setup_logging()
 
     try:
-        # 示例输入文本
-        input_text = """
-（一）事故发生的时间和地点。 
-2025 年 8 月12日22时51分46秒，位于天津市滨海新区
-吉运二道95号的瑞海公司危险品仓库（北纬39°02′22.98″，东
-经117 °44′11.64″。地理方位示意图见图1）运抵区（"待申报
-装船出口货物运抵区"的简称，属于海关监管场所，用金属栅栏
-与外界隔离。由经营企业申请设立，海关批准，主要用于出口集
-装箱货物的运抵和报关监管）最先起火，23时34分06秒发生
-第一次爆炸，23时34分37秒发生第二次更剧烈的爆炸。事故
-现场形成6处大火点及数十个小火点，8月14日16时40分，
-现场明火被扑灭。
-天气：多云
-温度：12℃
-风向：东
-风力：4 级
-空气湿度：37 
-（二）事故现场情况。 
-事故现场按受损程度，分为事故中心区、爆炸冲击波波及区。
-事故中心区为此次事故中受损最严重区域，该区域东至跃进路、
-西至海滨高速、南至顺安仓储有限公司、北至吉运三道，面积约为54万平
-方米。两次爆炸分别形成一个直径15米、深1.1米的月牙形小
-爆坑和一个直径97米、深2.7米的圆形大爆坑。以大爆坑为爆
-炸中心，150米范围内的建筑被摧毁，东侧的瑞海公司综合楼和
-南侧的中联建通公司办公楼只剩下钢筋混凝土框架；堆场内大量
-普通集装箱和罐式集装箱被掀翻、解体、炸飞，形成由南至北的
-3 座巨大堆垛，一个罐式集装箱被抛进中联建通公司办公楼4层
-房间内，多个集装箱被抛到该建筑楼顶；参与救援的消防车、警
-车和位于爆炸中心南侧的吉运一道和北侧吉运三道附近的顺安
-仓储有限公司、安邦国际贸易有限公司储存的7641辆商品汽车
-和现场灭火的30辆消防车在事故中全部损毁，邻近中心区的贵
-龙实业、新东物流、港湾物流等公司的4787辆汽车受损。
-爆炸冲击波波及区分为严重受损区、中度受损区。严重受损
-区是指建筑结构、外墙、吊顶受损的区域，受损建筑部分主体承
-重构件（柱、梁、楼板）的钢筋外露，失去承重能力，不再满足
-安全使用条件。中度受损区是指建筑幕墙及门、窗受损的区域，
-受损建筑局部幕墙及部分门、窗变形、破裂。 
-严重受损区在不同方向距爆炸中心最远距离为：东 3 公里
-（亚实履带天津有限公司），西3.6公里（联通公司办公楼），南
-2.5 公里（天津振华国际货运有限公司），北 2.8 公里（天津丰
-田通商钢业公司）。中度受损区在不同方向距爆炸中心最远距离
-为：东3.42公里（国际物流验放中心二场），西5.4公里（中国
-检验检疫集团办公楼），南5公里（天津港物流大厦），北5.4公
-里（天津海运职业学院）。受地形地貌、建筑位置和结构等因素
-影响，同等距离范围内的建筑受损程度并不一致。 
-爆炸冲击波波及区以外的部分建筑，虽没有受到爆炸冲击波
-直接作用，但由于爆炸产生地面震动，造成建筑物接近地面部位
-的门、窗玻璃受损，东侧最远达8.5公里（东疆港宾馆），西侧
-最远达8.3公里（正德里居民楼），南侧最远达8公里（和丽苑
-居民小区），北侧最远达13.3公里（海滨大道永定新河收费站）。
-（三）人员伤亡和财产损失情况。 
-事故造成 165 人遇难（参与救援处置的公安现役消防人员
-24 人、天津港消防人员75人、公安民警11人，事故企业、周
-边企业员工和周边居民55人），8人失踪（天津港消防人员5人，
-周边企业员工、天津港消防人员家属3人），798 人受伤住院治
-疗（伤情重及较重的伤员58人、轻伤员740人）；304幢建筑物
-（其中办公楼宇、厂房及仓库等单位建筑73幢，居民1类住宅
-91 幢、2类住宅129幢、居民公寓11幢）、12428辆商品汽车、
-7533 个集装箱受损。 
-事故调查组依据《企业职工伤亡事故经济损失统计标准》
-（GB6721-1986）等标准和规定统计，
-核定直接经济损失
-（四）危险化学品情况。 
-通过分析事发时瑞海公司储存的 111 种危险货物的化学组
-分，确定至少有129种化学物质发生爆炸燃烧或泄漏扩散，其中，
-氢氧化钠、硝酸钾、硝酸铵、氰化钠、金属镁和硫化钠这6种物
-质的重量占到总重量的50%。同时，爆炸还引燃了周边建筑物以
-及大量汽车、焦炭等普通货物。本次事故残留的化学品与产生的
-二次污染物逾百种，对局部区域的大气环境、水环境和土壤环境
-造成了不同程度的污染。
-        """
+        # 示例输入文本（见同目录scenario.txt）
+        input_text = _load_default_input_text()
 
         # 创建控制器
         got_controller = create_operations_graph(input_text)
@@ -1715,163 +2381,69 @@ def main():
         # 获取所有阶段结果
         results = got_controller.get_final_thoughts()
         
-        # 创建存储各阶段结果的字典
-        response = {}
+        # 创建存储各阶段结果的字典：按已知阶段键预分配槽位，
+        # 避免逐键增长触发紧凑字典的扩容rehash
+        response = dict.fromkeys(_PHASE_NAMES)
         
-        # 使用debug_all_results收集所有阶段数据
-        all_results = {}
-        
-        for i, phase_thoughts in enumerate(results):
-            if phase_thoughts and len(phase_thoughts) > 0:
-                phase_key = f"phase_{i}"
-                # 创建可序列化的状态副本
-                state_copy = dict(phase_thoughts[-1].state)
-                if "graph" in state_copy:
-                    del state_copy["graph"]
-                all_results[phase_key] = state_copy
+        # 使用debug_all_results收集所有阶段数据：单个字典推导式构建
+        # 可序列化的状态副本（跳过graph键），C层循环替代逐阶段的
+        # Python分支与赋值；随后整体清空results释放Thought引用
+        all_results = {
+            f"phase_{i}": {
+                k: v for k, v in phase_thoughts[-1].state.items() if k != "graph"
+            }
+            for i, phase_thoughts in enumerate(results)
+            if phase_thoughts
+        }
+        results.clear()
+        logger.info("共捕获 %d 个阶段的结果", len(all_results))
         
         # 提取各个阶段的结果
-        logger.info(f"从最终状态中提取结果")
-        
-        # 第一阶段：情景分析 (从phase_0提取)
-        if "phase_0" in all_results and "state" in all_results["phase_0"]:
-            state = all_results["phase_0"]["state"]
-            if state:
-                situation_analysis = {
-                    "basic_info": state.get("basic_info", {}),
-                    "accident_info": state.get("accident_info", {}),
-                    "weather_conditions": state.get("weather_conditions", {}),
-                    "geographical_info": state.get("geographical_info", {}),
-                    "sensitive_targets": state.get("sensitive_targets", {})
-                }
-                response["situation_analysis"] = situation_analysis
-                logger.info(f"成功提取情景分析阶段的结果")
-        
-        # 获取最新状态中的影响评估 (可能在phase_1或phase_0中)
-        impact_assessment = None
-        for phase_key in ["phase_1", "phase_0"]:
-            if phase_key in all_results and "state" in all_results[phase_key]:
-                state = all_results[phase_key]["state"]
-                if state and "impact_assessment" in state:
-                    impact_assessment = state["impact_assessment"]
-                    response["impact_assessment"] = impact_assessment
-                    logger.info(f"成功提取影响评估阶段的结果")
-                    break
+        logger.info("从最终状态中提取结果")
         
-        # 获取最新状态中的响应计划 (可能在phase_2, phase_1, 或 phase_0中)
-        response_plan = None
-        for phase_key in ["phase_2", "phase_1", "phase_0"]:
-            if phase_key in all_results and "state" in all_results[phase_key]:
-                state = all_results[phase_key]["state"]
-                if state and "response_plan" in state:
-                    response_plan = state["response_plan"]
-                    response["response_plan"] = response_plan
-                    logger.info(f"成功提取响应计划阶段的结果")
+        # 按_PHASE_EXTRACTORS表提取三个阶段的结果，每个键只做一次哈希查找
+        for out_key, phase_keys, extract, msg in _PHASE_EXTRACTORS:
+            for phase_key in phase_keys:
+                phase = all_results.get(phase_key)
+                state = phase.get("state") if phase else None
+                if not state:
+                    continue
+                value = extract(state)
+                if value is not None:
+                    response[out_key] = value
+                    logger.info(msg)
                     break
         
         # 如果还没有找到响应计划，尝试从原始数据中提取
-        if "response_plan" not in response and len(results) > 2 and len(results[2]) > 0:
-            last_thought = results[2][-1]
-            if "state" in last_thought.state:
-                state = last_thought.state.get("state", {})
-                # 提取所有可能的响应计划字段
-                response_plan_data = {}
-                
-                # 检查emergency_level字段
-                if "emergency_level" in state:
-                    response_plan_data["emergency_level"] = state["emergency_level"]
-                    logger.info("提取了emergency_level字段")
-                    
-                # 检查evacuation_plan字段
-                if "evacuation_plan" in state:
-                    response_plan_data["evacuation_plan"] = state["evacuation_plan"]
-                    logger.info("提取了evacuation_plan字段")
-                    
-                # 检查onsite_response字段
-                if "onsite_response" in state:
-                    response_plan_data["onsite_response"] = state["onsite_response"]
-                    logger.info("提取了onsite_response字段")
-                    
-                # 检查medical_response字段
-                if "medical_response" in state:
-                    response_plan_data["medical_response"] = state["medical_response"]
-                    logger.info("提取了medical_response字段")
-                    
-                # 检查environmental_monitoring字段
-                if "environmental_monitoring" in state:
-                    response_plan_data["environmental_monitoring"] = state["environmental_monitoring"]
-                    logger.info("提取了environmental_monitoring字段")
-                    
-                # 检查resource_allocation字段
-                if "resource_allocation" in state:
-                    response_plan_data["resource_allocation"] = state["resource_allocation"]
-                    logger.info("提取了resource_allocation字段")
-                    
-                # 检查information_management字段
-                if "information_management" in state:
-                    response_plan_data["information_management"] = state["information_management"]
-                    logger.info("提取了information_management字段")
-                    
-                # 检查recovery_plan字段
-                if "recovery_plan" in state:
-                    response_plan_data["recovery_plan"] = state["recovery_plan"]
-                    logger.info("提取了recovery_plan字段")
-                    
-                # 检查secondary_disaster_prevention字段
-                if "secondary_disaster_prevention" in state:
-                    response_plan_data["secondary_disaster_prevention"] = state["secondary_disaster_prevention"]
-                    logger.info("提取了secondary_disaster_prevention字段")
-                    
-                # 检查special_material_handling字段
-                if "special_material_handling" in state:
-                    response_plan_data["special_material_handling"] = state["special_material_handling"]
-                    logger.info("提取了special_material_handling字段")
-                
+        # （原始Thought已释放，改读投影副本phase_2，内容等价）
+        phase_2 = all_results.get("phase_2")
+        if response["response_plan"] is None and phase_2 is not None:
+            if "state" in phase_2:
+                state = phase_2.get("state", {})
+                # 按字段表一次推导提取所有出现的响应计划字段，
+                # 替代逐字段的成员测试+赋值+逐条日志
+                response_plan_data = {
+                    key: state[key] for key in _RESPONSE_PLAN_FIELDS if key in state
+                }
+
                 # 如果找到了任何字段，将其保存到响应中
                 if response_plan_data:
                     response["response_plan"] = response_plan_data
-                    logger.info(f"从原始数据中提取了响应计划的 {len(response_plan_data)} 个字段")
+                    logger.info(
+                        "从原始数据中提取了响应计划的 %d 个字段: %s",
+                        len(response_plan_data), ", ".join(response_plan_data),
+                    )
                 else:
                     logger.warning("没有从原始数据中找到任何响应计划字段")
         
         # 保存结果
-        output_file = "examples/chemical_emergency/emergency_response_plan.json"
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(response, f, ensure_ascii=False, indent=2)
-            
-            completed_phases = len(response)
-            if completed_phases == 3:
-                logger.info(f"完整的应急响应方案已保存到 {output_file}")
-            else:
-                logger.warning(f"不完整的应急响应已保存到 {output_file}。只完成了 {completed_phases}/3 个阶段。")
-        except Exception as e:
-            logger.error(f"保存结果到文件时出错: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            
-        # 创建一个包含所有三个阶段结果的调试文件
-        debug_file = "examples/chemical_emergency/debug_all_results.json"
-        
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(debug_file), exist_ok=True)
-            
-            with open(debug_file, 'w', encoding='utf-8') as f:
-                json.dump(all_results, f, ensure_ascii=False, indent=2)
-            logger.info(f"所有阶段结果已保存到 {debug_file}")
-        except Exception as e:
-            logger.error(f"保存调试结果时出错: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-
-    except Exception as e:
-        logger.error(f"发生意外错误: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        # 序列化前滤掉未完成阶段的None哨兵
+        response = {k: v for k, v in response.items() if v is not None}
+
+        _persist_results(response, all_results)
+
+    except Exception:
+        logger.exception("发生意外错误")
         raise
 
 if __name__ == "__main__":
@@ -8,9 +8,13 @@
 
 from abc import ABC, abstractmethod
 from typing import List, Dict, Union, Any
+import atexit
+import dbm
 import json
 import os
 import logging
+import shelve
+import threading
 
 
 class AbstractLanguageModel(ABC):
@@ -35,8 +39,29 @@ class AbstractLanguageModel(ABC):
         self.config: Dict = None
         self.model_name: str = model_name
         self.cache = cache
+        # Serializes response-cache access: query() runs concurrently on
+        # executor threads and the shelve backend is not thread-safe.
+        self._cache_lock = threading.Lock()
         if self.cache:
-            self.response_cache: Dict[str, List[Any]] = {}
+            # Back the response cache with a shelve database so identical
+            # prompts are served from disk across runs instead of re-hitting
+            # the API. Falls back to a plain in-process dict when the cache
+            # file cannot be opened (e.g. read-only working directory).
+            cache_path = "%s_response_cache" % (
+                model_name or self.__class__.__name__.lower()
+            )
+            try:
+                self.response_cache = shelve.open(cache_path, writeback=False)
+                atexit.register(self.response_cache.close)
+            except (OSError, *dbm.error):
+                # dbm.error is a tuple of exception types and covers an
+                # existing but unreadable/corrupt cache file (e.g. a
+                # zero-length file left by a crash), which is not an OSError.
+                self.logger.warning(
+                    "Could not open response cache at %s, using in-memory cache",
+                    cache_path,
+                )
+                self.response_cache: Dict[str, List[Any]] = {}
         self.load_config(config_path)
         self.prompt_tokens: int = 0
         self.completion_tokens: int = 0
@@ -63,7 +88,8 @@ class AbstractLanguageModel(ABC):
         """
         Clear the response cache.
         """
-        self.response_cache.clear()
+        with self._cache_lock:
+            self.response_cache.clear()
 
     @abstractmethod
     def query(self, query: str, num_responses: int = 1) -> Any:
@@ -7,12 +7,16 @@
 # main author: Nils Blach
 
 import backoff
+import json
 import os
 import random
+import threading
 import time
 from typing import List, Dict, Union
 from openai import OpenAI, OpenAIError
-from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.completion_usage import CompletionUsage
 
 from .abstract_language_model import AbstractLanguageModel
 
@@ -50,6 +54,10 @@ class ChatGPT(AbstractLanguageModel):
         self.max_tokens: int = self.config["max_tokens"]
         # The stop sequence is a sequence of tokens that the model will stop generating at (it will not generate the stop sequence).
         self.stop: Union[str, List[str]] = self.config["stop"]
+        # When stream is enabled, single-response queries are streamed and the
+        # connection is closed as soon as the top-level JSON object is complete,
+        # saving the tokens the model would spend on trailing prose.
+        self.stream: bool = self.config.get("stream", False)
         # The account organization is the organization that is used for chatgpt.
         self.organization: str = self.config["organization"]
         if self.organization == "":
@@ -59,25 +67,45 @@ class ChatGPT(AbstractLanguageModel):
             raise ValueError("OPENAI_API_KEY is not set")
         # Initialize the OpenAI Client
         self.client = OpenAI(api_key=self.api_key, organization=self.organization, base_url="https://api.bianxie.ai/v1")
+        # chat() runs on multiple executor threads when queries are fanned
+        # out; the token/cost read-modify-writes need a lock to not lose
+        # updates.
+        self._usage_lock = threading.Lock()
 
     def query(
-        self, query: str, num_responses: int = 1
+        self, query: Union[str, List[Dict]], num_responses: int = 1
     ) -> Union[List[ChatCompletion], ChatCompletion]:
         """
         Query the OpenAI model for responses.
 
-        :param query: The query to be posed to the language model.
-        :type query: str
+        :param query: The query to be posed to the language model. Either a plain
+                      prompt string or a pre-built list of chat messages, which allows
+                      callers to keep a static system prefix separate from the
+                      request-specific user message so provider-side prompt-prefix
+                      caching can reuse the static part across requests.
+        :type query: Union[str, List[Dict]]
         :param num_responses: Number of desired responses, default is 1.
         :type num_responses: int
         :return: Response(s) from the OpenAI model.
         :rtype: Dict
         """
-        if self.cache and query in self.response_cache:
-            return self.response_cache[query]
+        if isinstance(query, str):
+            messages = [{"role": "user", "content": query}]
+            cache_key = query
+        else:
+            messages = query
+            cache_key = json.dumps(query, sort_keys=True)
+
+        if self.cache:
+            with self._cache_lock:
+                if cache_key in self.response_cache:
+                    return self.response_cache[cache_key]
 
         if num_responses == 1:
-            response = self.chat([{"role": "user", "content": query}], num_responses)
+            if self.stream:
+                response = self.chat_stream(messages)
+            else:
+                response = self.chat(messages, num_responses)
         else:
             response = []
             next_try = num_responses
@@ -85,7 +113,7 @@ class ChatGPT(AbstractLanguageModel):
             while num_responses > 0 and total_num_attempts > 0:
                 try:
                     assert next_try > 0
-                    res = self.chat([{"role": "user", "content": query}], next_try)
+                    res = self.chat(messages, next_try)
                     response.append(res)
                     num_responses -= next_try
                     next_try = min(num_responses, next_try)
@@ -98,7 +126,8 @@ class ChatGPT(AbstractLanguageModel):
                     total_num_attempts -= 1
 
         if self.cache:
-            self.response_cache[query] = response
+            with self._cache_lock:
+                self.response_cache[cache_key] = response
         return response
 
     @backoff.on_exception(backoff.expo, OpenAIError, max_time=10, max_tries=6)
@@ -123,14 +152,125 @@ class ChatGPT(AbstractLanguageModel):
             stop=self.stop,
         )
 
-        self.prompt_tokens += response.usage.prompt_tokens
-        self.completion_tokens += response.usage.completion_tokens
-        prompt_tokens_k = float(self.prompt_tokens) / 1000.0
-        completion_tokens_k = float(self.completion_tokens) / 1000.0
-        self.cost = (
-            self.prompt_token_cost * prompt_tokens_k
-            + self.response_token_cost * completion_tokens_k
+        with self._usage_lock:
+            self.prompt_tokens += response.usage.prompt_tokens
+            self.completion_tokens += response.usage.completion_tokens
+            prompt_tokens_k = float(self.prompt_tokens) / 1000.0
+            completion_tokens_k = float(self.completion_tokens) / 1000.0
+            self.cost = (
+                self.prompt_token_cost * prompt_tokens_k
+                + self.response_token_cost * completion_tokens_k
+            )
+        self.logger.info(
+            f"This is the response from chatgpt: {response}"
+            f"\nThis is the cost of the response: {self.cost}"
         )
+        return response
+
+    @backoff.on_exception(backoff.expo, OpenAIError, max_time=10, max_tries=6)
+    def chat_stream(self, messages: List[Dict]) -> ChatCompletion:
+        """
+        Stream a single chat completion and close the connection as soon as the
+        first top-level JSON object in the output is balanced. Tokens the model
+        would emit after the closing brace (trailing prose, apologies) are never
+        generated, which reduces both cost and tail latency for JSON-only tasks.
+        Implements backoff on OpenAI error.
+
+        :param messages: A list of message dictionaries for the chat.
+        :type messages: List[Dict]
+        :return: A ChatCompletion assembled from the streamed deltas.
+        :rtype: ChatCompletion
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model_id,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            n=1,
+            stop=self.stop,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        parts: List[str] = []
+        depth = 0
+        in_string = False
+        escaped = False
+        seen_object = False
+        complete = False
+        usage = None
+        response_id = ""
+        created = 0
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if not response_id:
+                response_id = chunk.id
+                created = chunk.created
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            # Brace-balance scan: track string/escape state so braces inside
+            # JSON string values do not affect the depth counter.
+            for position, char in enumerate(delta):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                    seen_object = True
+                elif char == "}":
+                    depth -= 1
+                    if seen_object and depth == 0:
+                        # Keep the delta only up to the closing brace.
+                        delta = delta[: position + 1]
+                        complete = True
+                        break
+            parts.append(delta)
+            if complete:
+                stream.close()
+                break
+
+        content = "".join(parts)
+        # The usage chunk is the last one in the stream, so it never arrives
+        # when early termination closed the stream -- the normal case here.
+        # Estimate at roughly 4 characters per token so cost accounting stays
+        # approximately right instead of silently reporting zero.
+        if usage is None:
+            prompt_chars = sum(len(m.get("content") or "") for m in messages)
+            usage = CompletionUsage.construct(
+                prompt_tokens=max(1, prompt_chars // 4),
+                completion_tokens=max(1, len(content) // 4),
+                total_tokens=max(1, prompt_chars // 4) + max(1, len(content) // 4),
+            )
+        message = ChatCompletionMessage.construct(role="assistant", content=content)
+        choice = Choice.construct(index=0, message=message, finish_reason="stop")
+        response = ChatCompletion.construct(
+            id=response_id,
+            choices=[choice],
+            created=created,
+            model=self.model_id,
+            object="chat.completion",
+            usage=usage,
+        )
+
+        with self._usage_lock:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+            prompt_tokens_k = float(self.prompt_tokens) / 1000.0
+            completion_tokens_k = float(self.completion_tokens) / 1000.0
+            self.cost = (
+                self.prompt_token_cost * prompt_tokens_k
+                + self.response_token_cost * completion_tokens_k
+            )
         self.logger.info(
             f"This is the response from chatgpt: {response}"
             f"\nThis is the cost of the response: {self.cost}"
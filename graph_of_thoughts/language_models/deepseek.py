@@ -5,20 +5,85 @@
 # found in the LICENSE file.
 
 import backoff
+import hashlib
 import os
 import random
 import time
 import logging
 import asyncio
+import threading
+from itertools import chain
+from operator import attrgetter
 from typing import List, Dict, Union
 from openai import AsyncOpenAI, OpenAIError
 from openai.types.chat.chat_completion import ChatCompletion
 from contextlib import asynccontextmanager
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 from .abstract_language_model import AbstractLanguageModel
 
 logger = logging.getLogger(__name__)
 
+# Only responses that took at least this long to obtain are written to the
+# response cache; trivially fast calls are cheaper to redo than to store.
+CACHE_MIN_SECONDS = 0.5
+
+# AsyncOpenAI clients shared across DeepSeek instances, keyed by endpoint and
+# credentials: each client owns an HTTPX connection pool, so reusing one
+# across instances avoids repeated TLS handshakes and TCP slow-start. All
+# clients are created on and driven by the single shared background loop
+# below; an httpx pool must never be used from more than one event loop.
+_CLIENTS: Dict[tuple, AsyncOpenAI] = {}
+
+# One background event loop shared by every DeepSeek instance, refcounted so
+# the thread is torn down when the last instance is closed. A single loop is
+# what makes sharing the clients above safe: per-instance loops would hand a
+# pool created on one loop to coroutines running on another.
+_LOOP_LOCK = threading.Lock()
+_LOOP: asyncio.AbstractEventLoop = None
+_LOOP_THREAD: threading.Thread = None
+_LOOP_REFS = 0
+
+
+def _acquire_loop() -> asyncio.AbstractEventLoop:
+    """Start the shared background loop if needed and take a reference."""
+    global _LOOP, _LOOP_THREAD, _LOOP_REFS
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            _LOOP_THREAD = threading.Thread(
+                target=_LOOP.run_forever, name="deepseek-loop", daemon=True
+            )
+            _LOOP_THREAD.start()
+        _LOOP_REFS += 1
+        return _LOOP
+
+
+def _release_loop() -> None:
+    """Drop one reference; stop the loop and forget its clients on the last."""
+    global _LOOP, _LOOP_THREAD, _LOOP_REFS
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            return
+        _LOOP_REFS -= 1
+        if _LOOP_REFS > 0:
+            return
+        loop, thread = _LOOP, _LOOP_THREAD
+        _LOOP = _LOOP_THREAD = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        # The cached clients are bound to the stopped loop and would fail at
+        # request time; the next instance recreates them on a fresh loop.
+        _CLIENTS.clear()
+
+# Prebound attribute accessors for flattening responses into texts.
+_GET_CHOICES = attrgetter("choices")
+_GET_CONTENT = attrgetter("message.content")
+
 class DeepSeek(AbstractLanguageModel):
     """
     The DeepSeek class handles interactions with the DeepSeek models using the provided configuration.
@@ -61,42 +126,99 @@ class DeepSeek(AbstractLanguageModel):
             raise ValueError("DEEPSEEK_API_KEY is not set")
         # Maximum concurrent requests
         self.max_concurrent = 10
-        # Event loop
-        self._loop = None
-        # Add a class-level client
-        self._client = None
-        self._client_lock = asyncio.Lock()
+        # Static completion kwargs, built once so chat() does not rebuild the
+        # same dict on every request (and every backoff retry).
+        self._chat_kwargs: Dict = {
+            "model": self.model_id,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "n": 1,  # DeepSeek API doesn't support n>1
+            "stop": self.stop,
+        }
+        # Queries are submitted to the shared background loop from sync
+        # callers, so the AsyncOpenAI client's connection pool survives
+        # across query() calls and instances instead of being torn down
+        # with a per-call loop.
+        self._closed = False
+        self._loop = _acquire_loop()
 
     @asynccontextmanager
     async def _get_client(self):
         """
-        Optimized client management, using singleton pattern
+        Yield the AsyncOpenAI client shared by all instances talking to the
+        same endpoint with the same key. The client is created once per
+        (api_base, api_key) pair and left open until the last instance is
+        closed; HTTPX recovers its own pool after request failures. This
+        always runs on the single shared loop and there is no await between
+        the lookup and the insert, so creation needs no extra locking.
         """
-        if self._client is None:
-            async with self._client_lock:
-                if self._client is None:
-                    self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.api_base)
+        key = (self.api_base, self.api_key)
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.api_base,
+                http_client=self._build_http_client(),
+            )
+        yield client
+
+    def _build_http_client(self):
+        """
+        Build the transport for the shared AsyncOpenAI client. With the
+        optional h2 package installed a single HTTP/2 connection multiplexes
+        all concurrent completions over one TLS session; otherwise an
+        HTTP/1.1 pool sized to max_concurrent avoids opening more sockets
+        than the fan-out can use. Returns None when httpx is unavailable so
+        the OpenAI client falls back to its own default transport.
+        """
+        if httpx is None:
+            return None
+        limits = httpx.Limits(
+            max_connections=self.max_concurrent,
+            max_keepalive_connections=self.max_concurrent,
+        )
         try:
-            yield self._client
-        except Exception:
-            # Only close and recreate client when there's an exception
-            if self._client:
-                await self._client.close()
-                self._client = None
-            raise
+            return httpx.AsyncClient(http2=True, timeout=60, limits=limits)
+        except ImportError:
+            # http2=True requires the optional h2 package
+            return httpx.AsyncClient(timeout=60, limits=limits)
+
+    def _cache_key(self, query: str) -> str:
+        """
+        Build a compact response-cache key for a prompt.
+
+        Multi-kilobyte prompts are reduced to a blake2b hex digest so cache
+        lookups hash a short string instead of re-hashing the full prompt on
+        every membership test; str keys also satisfy the shelve-backed
+        persistent cache.
+
+        :param query: The query string to derive the key from.
+        :type query: str
+        :return: A 32-character hex digest identifying the query.
+        :rtype: str
+        """
+        return hashlib.blake2b(query.encode("utf-8"), digest_size=16).hexdigest()
 
-    def _ensure_loop(self):
+    def close(self) -> None:
         """
-        Ensure we have a running event loop.
+        Release this instance's reference to the shared background loop.
+        Safe to call multiple times; the instance cannot be queried
+        afterwards. The loop, the shared clients and their connection pools
+        stay open as long as any other instance still holds a reference.
         """
+        if self._closed:
+            return
+        self._closed = True
+        _release_loop()
+
+    def __del__(self) -> None:
         try:
-            self._loop = asyncio.get_running_loop()
-        except RuntimeError:
-            self._loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self._loop)
+            self.close()
+        except Exception:
+            pass
 
     def query(
-        self, query: str, num_responses: int = 1
+        self, query: str, num_responses: int = 1, min_responses: int = None
     ) -> Union[List[ChatCompletion], ChatCompletion]:
         """
         Query the DeepSeek model for responses.
@@ -105,33 +227,39 @@ class DeepSeek(AbstractLanguageModel):
         :type query: str
         :param num_responses: Number of desired responses, default is 1.
         :type num_responses: int
+        :param min_responses: Return as soon as this many responses have
+                              arrived, cancelling the stragglers. Defaults to
+                              None, meaning wait for all num_responses.
+        :type min_responses: int
         :return: Response(s) from the DeepSeek model.
         :rtype: Dict
         """
-        if self.cache and query in self.response_cache:
-            return self.response_cache[query]
-
-        # Ensure we have a running event loop
-        self._ensure_loop()
+        if self.cache:
+            cache_key = self._cache_key(query)
+            with self._cache_lock:
+                if cache_key in self.response_cache:
+                    return self.response_cache[cache_key]
 
-        # Run async query in event loop
-        try:
-            responses = self._loop.run_until_complete(self._async_query(query, num_responses))
-        except RuntimeError as e:
-            if str(e) == 'Event loop is closed':
-                # If the loop is closed, create a new one
-                self._loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self._loop)
-                responses = self._loop.run_until_complete(self._async_query(query, num_responses))
-            else:
-                raise
+        # Submit the async query to the persistent background loop; this
+        # works from any thread and never hits a closed or foreign loop.
+        start = time.monotonic()
+        future = asyncio.run_coroutine_threadsafe(
+            self._async_query(query, num_responses, min_responses), self._loop
+        )
+        responses = future.result()
+        elapsed = time.monotonic() - start
 
-        if self.cache:
-            self.response_cache[query] = responses
-        return responses[0] if len(responses) == 1 else responses
+        result = responses[0] if len(responses) == 1 else responses
+        if self.cache and elapsed >= CACHE_MIN_SECONDS:
+            # Store the same shape that is returned, so cache hits do not
+            # come back as a one-element list where a bare response went out.
+            # Only responses that were expensive to obtain are persisted.
+            with self._cache_lock:
+                self.response_cache[cache_key] = result
+        return result
 
     async def _async_query(
-        self, query: str, num_responses: int = 1
+        self, query: str, num_responses: int = 1, min_responses: int = None
     ) -> List[ChatCompletion]:
         """
         Asynchronously query the DeepSeek model for multiple responses.
@@ -140,35 +268,55 @@ class DeepSeek(AbstractLanguageModel):
         :type query: str
         :param num_responses: Number of desired responses, default is 1.
         :type num_responses: int
+        :param min_responses: Stop waiting once this many responses have
+                              arrived and cancel the remaining tasks.
+                              Defaults to None (wait for all).
+        :type min_responses: int
         :return: List of responses from the DeepSeek model.
         :rtype: List[ChatCompletion]
         """
         messages = [{"role": "user", "content": query}]
-        tasks = []
         responses = []
-        
-        # Create semaphore to limit concurrent requests
-        semaphore = asyncio.Semaphore(self.max_concurrent)
-        
+
         async with self._get_client() as client:
-            # Create tasks for all required responses
-            for _ in range(num_responses):
-                task = asyncio.create_task(self._bounded_chat(messages, semaphore, client))
-                tasks.append(task)
-            
-            # Wait for all tasks to complete
-            completed_responses = await asyncio.gather(*tasks, return_exceptions=True)
+            if num_responses <= self.max_concurrent:
+                # The semaphore cannot block at this fan-out; skip the
+                # bounded wrapper and its two scheduler hops per task.
+                tasks = [
+                    asyncio.create_task(self.chat(messages, client))
+                    for _ in range(num_responses)
+                ]
+            else:
+                semaphore = asyncio.Semaphore(self.max_concurrent)
+                tasks = [
+                    asyncio.create_task(
+                        self._bounded_chat(messages, semaphore, client)
+                    )
+                    for _ in range(num_responses)
+                ]
             
-            # Process responses and handle any errors
-            for response in completed_responses:
-                if isinstance(response, Exception):
-                    self.logger.warning(f"Error in deepseek: {response}")
+            # Collect responses in completion order; once min_responses have
+            # arrived the stragglers are cancelled, so latency tracks the
+            # k-th fastest request instead of the slowest.
+            target = (
+                num_responses
+                if min_responses is None
+                else min(min_responses, num_responses)
+            )
+            for future in asyncio.as_completed(tasks):
+                try:
+                    responses.append(await future)
+                except Exception as error:
+                    self.logger.warning(f"Error in deepseek: {error}")
                     continue
-                responses.append(response)
-            
+                if len(responses) >= target:
+                    break
+            for task in tasks:
+                task.cancel()
+
             if not responses:
                 raise Exception("All requests failed")
-            
+
             return responses
 
     async def _bounded_chat(
@@ -209,25 +357,26 @@ class DeepSeek(AbstractLanguageModel):
         :rtype: ChatCompletion
         """
         response = await client.chat.completions.create(
-            model=self.model_id,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            n=1,  # DeepSeek API doesn't support n>1
-            stop=self.stop,
+            messages=messages, **self._chat_kwargs
         )
 
         self.prompt_tokens += response.usage.prompt_tokens
         self.completion_tokens += response.usage.completion_tokens
-        prompt_tokens_k = float(self.prompt_tokens) / 1000.0
-        completion_tokens_k = float(self.completion_tokens) / 1000.0
-        self.cost = (
-            self.prompt_token_cost * prompt_tokens_k
-            + self.response_token_cost * completion_tokens_k
-        )
+        # Accumulate the cost of this call directly instead of recomputing
+        # the full total from the running token counters each time.
+        self.cost += (
+            response.usage.prompt_tokens * self.prompt_token_cost
+            + response.usage.completion_tokens * self.response_token_cost
+        ) / 1000.0
+        # The full ChatCompletion (including the completion text) is only
+        # worth formatting when DEBUG is on; at INFO a short accounting line
+        # keeps log volume proportional to the number of calls, not tokens.
+        self.logger.debug("deepseek response: %s", response)
         self.logger.info(
-            f"This is the response from deepseek: {response}"
-            f"\nThis is the cost of the response: {self.cost}"
+            "deepseek cost=%.4f tokens=%d/%d",
+            self.cost,
+            response.usage.prompt_tokens,
+            response.usage.completion_tokens,
         )
         return response
 
@@ -244,8 +393,11 @@ class DeepSeek(AbstractLanguageModel):
         """
         if not isinstance(query_response, List):
             query_response = [query_response]
-        return [
-            choice.message.content
-            for response in query_response
-            for choice in response.choices
-        ]
\ No newline at end of file
+        # chain.from_iterable + map run the flattening loop in C; the nested
+        # comprehension pays interpreted attribute lookups per choice.
+        return list(
+            map(
+                _GET_CONTENT,
+                chain.from_iterable(map(_GET_CHOICES, query_response)),
+            )
+        )
\ No newline at end of file
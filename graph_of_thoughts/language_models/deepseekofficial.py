@@ -5,15 +5,27 @@
 # found in the LICENSE file.
 
 import backoff
+import hashlib
 import os
-import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from operator import attrgetter
 from typing import List, Dict, Union
 from openai import OpenAI, OpenAIError
 from openai.types.chat.chat_completion import ChatCompletion
 
 from graph_of_thoughts.language_models.abstract_language_model import AbstractLanguageModel
 
+# Only responses that took at least this long to obtain are written to the
+# response cache; trivially fast calls are cheaper to redo than to store.
+CACHE_MIN_SECONDS = 0.5
+
+# Prebound attribute accessors for flattening responses into texts.
+_GET_CHOICES = attrgetter("choices")
+_GET_CONTENT = attrgetter("message.content")
+
 
 class DeepSeekOfficial(AbstractLanguageModel):
     """
@@ -57,6 +69,34 @@ class DeepSeekOfficial(AbstractLanguageModel):
             raise ValueError("DEEPSEEK_API_KEY is not set")
         # Initialize the OpenAI Client with DeepSeek base URL
         self.client = OpenAI(api_key=self.api_key, base_url=self.api_base)
+        # Static completion kwargs, built once so chat() does not rebuild the
+        # same dict on every request (and every backoff retry); n stays a
+        # per-call argument.
+        self._chat_kwargs: Dict = {
+            "model": self.model_id,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stop": self.stop,
+        }
+        # chat() runs on multiple executor threads for multi-sample queries;
+        # the token/cost read-modify-writes need a lock to not lose updates.
+        self._usage_lock = threading.Lock()
+
+    def _cache_key(self, query: str) -> str:
+        """
+        Build a compact response-cache key for a prompt.
+
+        Multi-kilobyte prompts are reduced to a blake2b hex digest so cache
+        lookups hash a short string instead of re-hashing the full prompt on
+        every membership test; str keys also satisfy the shelve-backed
+        persistent cache.
+
+        :param query: The query string to derive the key from.
+        :type query: str
+        :return: A 32-character hex digest identifying the query.
+        :rtype: str
+        """
+        return hashlib.blake2b(query.encode("utf-8"), digest_size=16).hexdigest()
 
     def query(
         self, query: str, num_responses: int = 1
@@ -71,32 +111,42 @@ class DeepSeekOfficial(AbstractLanguageModel):
         :return: Response(s) from the DeepSeek model.
         :rtype: Dict
         """
-        if self.cache and query in self.response_cache:
-            return self.response_cache[query]
+        if self.cache:
+            cache_key = self._cache_key(query)
+            with self._cache_lock:
+                if cache_key in self.response_cache:
+                    return self.response_cache[cache_key]
 
+        messages = [{"role": "user", "content": query}]
+        start = time.monotonic()
         if num_responses == 1:
-            response = self.chat([{"role": "user", "content": query}], num_responses)
+            response = self.chat(messages, num_responses)
         else:
+            # The DeepSeek API does not support n>1, so each sample is its own
+            # HTTP round trip. Issue them concurrently instead of serially
+            # halving the batch on failure; backoff inside chat still handles
+            # per-request retries.
             response = []
-            next_try = num_responses
-            total_num_attempts = num_responses
-            while num_responses > 0 and total_num_attempts > 0:
-                try:
-                    assert next_try > 0
-                    res = self.chat([{"role": "user", "content": query}], next_try)
-                    response.append(res)
-                    num_responses -= next_try
-                    next_try = min(num_responses, next_try)
-                except Exception as e:
-                    next_try = (next_try + 1) // 2
-                    self.logger.warning(
-                        f"Error in deepseek: {e}, trying again with {next_try} samples"
-                    )
-                    time.sleep(random.randint(1, 3))
-                    total_num_attempts -= 1
-
-        if self.cache:
-            self.response_cache[query] = response
+            with ThreadPoolExecutor(
+                max_workers=min(num_responses, 10)
+            ) as executor:
+                futures = [
+                    executor.submit(self.chat, messages, 1)
+                    for _ in range(num_responses)
+                ]
+                for future in as_completed(futures):
+                    error = future.exception()
+                    if error is not None:
+                        self.logger.warning(f"Error in deepseek: {error}")
+                        continue
+                    response.append(future.result())
+
+        # Only responses that were expensive to obtain are persisted. An
+        # empty list means every concurrent sample failed -- caching that
+        # would permanently pin the outage to this prompt in the shelf.
+        if self.cache and response and time.monotonic() - start >= CACHE_MIN_SECONDS:
+            with self._cache_lock:
+                self.response_cache[cache_key] = response
         return response
 
     @backoff.on_exception(backoff.expo, OpenAIError, max_time=10, max_tries=6)
@@ -113,25 +163,27 @@ class DeepSeekOfficial(AbstractLanguageModel):
         :rtype: ChatCompletion
         """
         response = self.client.chat.completions.create(
-            model=self.model_id,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            n=num_responses,
-            stop=self.stop,
+            messages=messages, n=num_responses, **self._chat_kwargs
         )
 
-        self.prompt_tokens += response.usage.prompt_tokens
-        self.completion_tokens += response.usage.completion_tokens
-        prompt_tokens_k = float(self.prompt_tokens) / 1000.0
-        completion_tokens_k = float(self.completion_tokens) / 1000.0
-        self.cost = (
-            self.prompt_token_cost * prompt_tokens_k
-            + self.response_token_cost * completion_tokens_k
-        )
+        with self._usage_lock:
+            self.prompt_tokens += response.usage.prompt_tokens
+            self.completion_tokens += response.usage.completion_tokens
+            # Accumulate the cost of this call directly instead of recomputing
+            # the full total from the running token counters each time.
+            self.cost += (
+                response.usage.prompt_tokens * self.prompt_token_cost
+                + response.usage.completion_tokens * self.response_token_cost
+            ) / 1000.0
+        # The full ChatCompletion (including the completion text) is only
+        # worth formatting when DEBUG is on; at INFO a short accounting line
+        # keeps log volume proportional to the number of calls, not tokens.
+        self.logger.debug("deepseek response: %s", response)
         self.logger.info(
-            f"This is the response from deepseek: {response}"
-            f"\nThis is the cost of the response: {self.cost}"
+            "deepseek cost=%.4f tokens=%d/%d",
+            self.cost,
+            response.usage.prompt_tokens,
+            response.usage.completion_tokens,
         )
         return response
 
@@ -148,8 +200,11 @@ class DeepSeekOfficial(AbstractLanguageModel):
         """
         if not isinstance(query_response, List):
             query_response = [query_response]
-        return [
-            choice.message.content
-            for response in query_response
-            for choice in response.choices
-        ]
\ No newline at end of file
+        # chain.from_iterable + map run the flattening loop in C; the nested
+        # comprehension pays interpreted attribute lookups per choice.
+        return list(
+            map(
+                _GET_CONTENT,
+                chain.from_iterable(map(_GET_CHOICES, query_response)),
+            )
+        )
\ No newline at end of file